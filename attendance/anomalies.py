@@ -0,0 +1,146 @@
+# attendance/anomalies.py
+# Incremental proxy-attendance detection. Each scan is fed through sliding-window
+# counters keyed by (session, ip) and (session, device); a key that marks too
+# many distinct students inside the window is flagged as it happens. State only
+# covers the current window, so memory does not grow with history. An optional
+# late-token rule flags tokens used right at expiry (see LATE_TOKEN_SECONDS).
+import threading
+from collections import Counter, OrderedDict, deque
+
+from django.conf import settings
+
+from .models import ScanAnomaly
+
+DEFAULT_RULES = {
+    'WINDOW': 10,                   # seconds
+    'SHARED_IP_THRESHOLD': 30,      # distinct students per IP within the window
+    'SHARED_DEVICE_THRESHOLD': 30,  # distinct students per device within the window
+    # Token used this close to its expiry; None turns the rule off. Off by default:
+    # records only say which scanner read a token, not where it was displayed, so
+    # the "from another scanner" half of this check can't be made, and timing
+    # alone flags every honest scan that lands just before the 30 s refresh.
+    'LATE_TOKEN_SECONDS': None,
+    'MAX_KEYS': 10000,              # tracked keys before the least recent is dropped
+}
+
+def anomaly_rules():
+    return {**DEFAULT_RULES, **getattr(settings, 'ATTENDANCE_ANOMALY_RULES', {})}
+
+class SlidingWindowCounter:
+    """Distinct students seen per key within the last `window` seconds"""
+
+    def __init__(self, window, max_keys):
+        self.window = window
+        self.max_keys = max_keys
+        self.events = OrderedDict()  # key -> (deque of (time, student), Counter of students)
+
+    def add(self, key, when, student_id):
+        events, students = self.events.pop(key, None) or (deque(), Counter())
+        events.append((when, student_id))
+        students[student_id] += 1
+        while when - events[0][0] > self.window:
+            _, old_student = events.popleft()
+            students[old_student] -= 1
+            if not students[old_student]:
+                del students[old_student]
+
+        self.events[key] = (events, students)
+        if len(self.events) > self.max_keys:
+            self.events.popitem(last=False)
+        return len(students)
+
+    def forget(self, predicate):
+        for key in [key for key in self.events if predicate(key)]:
+            del self.events[key]
+
+class ScanAnomalyDetector:
+    def __init__(self, rules=None):
+        self.rules = rules or anomaly_rules()
+        self.counters = {
+            'shared_ip': SlidingWindowCounter(self.rules['WINDOW'], self.rules['MAX_KEYS']),
+            'shared_device': SlidingWindowCounter(self.rules['WINDOW'], self.rules['MAX_KEYS']),
+        }
+        self.thresholds = {
+            'shared_ip': self.rules['SHARED_IP_THRESHOLD'],
+            'shared_device': self.rules['SHARED_DEVICE_THRESHOLD'],
+        }
+        # (kind, session, key) -> time last flagged, so a burst is reported once per window
+        self.flagged = OrderedDict()
+        self.lock = threading.Lock()
+
+    def check(self, record):
+        """Unsaved ScanAnomaly objects raised by this record"""
+        if record.source != 'scan':
+            # Bulk marks come from the admin's own browser, and check-ins from
+            # students' phones, where one browser build or NAT address is normal
+            return []
+        when = record.timestamp.timestamp()
+        found = []
+        keys = {'shared_ip': record.ip_address, 'shared_device': record.device_id}
+
+        with self.lock:
+            for kind, key in keys.items():
+                if not key:
+                    continue
+                count = self.counters[kind].add((record.session_id, key), when, record.student_id)
+                if count < self.thresholds[kind]:
+                    continue
+                flag_key = (kind, record.session_id, key)
+                last = self.flagged.get(flag_key)
+                if last is not None and when - last <= self.rules['WINDOW']:
+                    continue
+                self.flagged[flag_key] = when
+                if len(self.flagged) > self.rules['MAX_KEYS']:
+                    self.flagged.popitem(last=False)
+                found.append(ScanAnomaly(
+                    session_id=record.session_id, record=record, kind=kind,
+                    key=str(key), student_count=count, observed_at=record.timestamp
+                ))
+
+        if self.rules['LATE_TOKEN_SECONDS'] is not None and record.qr_code_id is not None:
+            remaining = (record.qr_code.expires_at - record.timestamp).total_seconds()
+            if remaining <= self.rules['LATE_TOKEN_SECONDS']:
+                found.append(ScanAnomaly(
+                    session_id=record.session_id, record=record, kind='late_token',
+                    key=str(record.ip_address or ''), observed_at=record.timestamp
+                ))
+        return found
+
+    def observe(self, record):
+        """Check a freshly saved record and store any anomalies it raises"""
+        found = self.check(record)
+        if found:
+            ScanAnomaly.objects.bulk_create(found)
+        return found
+
+    def forget_session(self, session_id):
+        with self.lock:
+            for counter in self.counters.values():
+                counter.forget(lambda key: key[0] == session_id)
+            for flag_key in [flag_key for flag_key in self.flagged if flag_key[1] == session_id]:
+                del self.flagged[flag_key]
+
+# Shared by the scan views of this process
+detector = ScanAnomalyDetector()
+
+def backfill(records, batch_size=1000):
+    """Run a fresh detector over old records, ordered by session then time.
+    Returns the number of anomalies stored."""
+    replay = ScanAnomalyDetector()
+    pending = []
+    stored = 0
+    current_session = None
+
+    for record in records:
+        if record.session_id != current_session:
+            if current_session is not None:
+                replay.forget_session(current_session)
+            current_session = record.session_id
+        pending.extend(replay.check(record))
+        if len(pending) >= batch_size:
+            ScanAnomaly.objects.bulk_create(pending)
+            stored += len(pending)
+            pending = []
+
+    ScanAnomaly.objects.bulk_create(pending)
+    return stored + len(pending)
@@ -0,0 +1,166 @@
+# attendance/arrivals.py
+# Scan arrival rates for sizing scanner stations. Scans are counted per
+# BUCKET_SECONDS bucket with one GROUP BY. For a session the bucket counts are
+# cached with the id of the newest record they include, so a live session
+# only queries the records that arrived since the last look. Deletes and edits
+# move the session's arrivals stamp (versions.py), which drops the counts
+# cached by every worker.
+import math
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Func, IntegerField, Max
+
+from . import versions
+from .models import AttendanceRecord, AttendanceSession
+
+BUCKET_SECONDS = 10
+
+def scan_seconds():
+    """Seconds one station takes per scan, used for queue and station estimates"""
+    return getattr(settings, 'ATTENDANCE_SCAN_SECONDS', 5)
+
+class EpochBucket(Func):
+    """Integer bucket number of a datetime: floor(unix time / size)"""
+    template = 'FLOOR(EXTRACT(EPOCH FROM %(expressions)s) / %(size)s)'
+    output_field = IntegerField()
+
+    def __init__(self, expression, size, **extra):
+        super().__init__(expression, size=int(size), **extra)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # Datetimes are stored as UTC text; strftime('%s') gives the epoch. The % is
+        # escaped twice: once for this template and once for the query parameters
+        return self.as_sql(
+            compiler, connection, template="CAST(strftime('%%%%s', %(expressions)s) AS INTEGER) / %(size)s",
+            **extra_context
+        )
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='FLOOR(UNIX_TIMESTAMP(%(expressions)s) / %(size)s)', **extra_context)
+
+def _epoch_key(session_id):
+    return f'attendance:session:{session_id}:arrivals_epoch'
+
+def forget_session_arrivals(session_id):
+    """Drop cached counts in every worker; needed when records are deleted or edited rather than added"""
+    versions.bump(_epoch_key(session_id))
+
+def _bucket_counts(records, *group_by):
+    # Manual marks from bulk edits are stamped when they were made, not when anyone arrived
+    return records.exclude(source='manual').annotate(bucket=EpochBucket('timestamp', BUCKET_SECONDS)).values(*group_by, 'bucket').annotate(
+        scans=Count('id'), last_id=Max('id')
+    ).order_by()
+
+def session_bucket_counts(session_id):
+    """{bucket number: scans} for a session, refreshed incrementally from the cache"""
+    key = f'attendance:session:{session_id}:arrivals:{versions.get(_epoch_key(session_id))}'
+    cached = cache.get(key)
+    counts, last_id = cached if cached else ({}, 0)
+
+    new_rows = list(_bucket_counts(AttendanceRecord.objects.filter(session_id=session_id, id__gt=last_id)))
+    if new_rows or not cached:
+        counts = dict(counts)
+        for row in new_rows:
+            counts[row['bucket']] = counts.get(row['bucket'], 0) + row['scans']
+            last_id = max(last_id, row['last_id'])
+        cache.set(key, (counts, last_id), timeout=getattr(settings, 'ATTENDANCE_ARRIVALS_CACHE_TTL', 86400))
+    return counts
+
+def rolling_minute(keys, scans):
+    """Scans in the minute ending at each bucket. `keys` must be sorted; buckets of
+    different groups must be more than a minute apart in key space."""
+    window = 60 // BUCKET_SECONDS
+    totals = np.concatenate([[0], np.cumsum(scans)])
+    starts = np.searchsorted(keys, keys - window + 1, side='left')
+    return totals[1:] - totals[starts]
+
+def queue_depth(scans, stations):
+    """Scans waiting at the end of each bucket if `stations` stations had served this
+    arrival pattern (Lindley recursion, in closed form)"""
+    capacity = stations * BUCKET_SECONDS / scan_seconds()
+    walk = np.cumsum(scans - capacity)
+    return walk - np.minimum(np.minimum.accumulate(walk), 0)
+
+def stations_needed(peak_per_minute):
+    return max(1, math.ceil(peak_per_minute * scan_seconds() / 60))
+
+def session_arrivals(session, stations=None):
+    counts = session_bucket_counts(session.id)
+    if not counts:
+        return {
+            'bucket_seconds': BUCKET_SECONDS, 'total': 0, 'buckets': [], 'peak_bucket': 0,
+            'peak_per_minute': 0, 'stations_needed': 0, 'stations': stations or 0, 'max_queue': 0,
+        }
+
+    # Dense series from the first to the last scan, quiet buckets included
+    first, last = min(counts), max(counts)
+    keys = np.arange(first, last + 1)
+    scans = np.array([counts.get(key, 0) for key in keys.tolist()], dtype=np.int64)
+    per_minute = rolling_minute(keys, scans)
+    needed = stations_needed(int(per_minute.max()))
+    stations = stations or needed
+    queue = queue_depth(scans, stations)
+
+    return {
+        'bucket_seconds': BUCKET_SECONDS,
+        'total': int(scans.sum()),
+        'buckets': [
+            {
+                'start': datetime.fromtimestamp(int(key) * BUCKET_SECONDS, tz=dt_timezone.utc).isoformat(),
+                'scans': int(count),
+                'queue': round(float(depth), 1),
+            }
+            for key, count, depth in zip(keys, scans, queue)
+        ],
+        'peak_bucket': int(scans.max()),
+        'peak_per_minute': int(per_minute.max()),
+        'stations_needed': needed,
+        'stations': stations,
+        'max_queue': round(float(queue.max()), 1),
+    }
+
+def course_arrival_peaks(course_code, sessions_queryset=None):
+    """Historical peaks of a course's sessions, per room"""
+    sessions_queryset = sessions_queryset if sessions_queryset is not None else AttendanceSession.objects.all()
+    sessions = pd.DataFrame(
+        list(sessions_queryset.filter(course_code=course_code).values('id', 'location')),
+        columns=['id', 'location'],
+    )
+    rows = pd.DataFrame(
+        list(_bucket_counts(AttendanceRecord.objects.filter(session_id__in=sessions['id'].tolist()), 'session_id')),
+        columns=['session_id', 'bucket', 'scans'],
+    )
+    if rows.empty:
+        return []
+
+    rows = rows.sort_values(['session_id', 'bucket'])
+    # Space sessions apart in key space so rolling windows never span two of them
+    span = int(rows['bucket'].max() - rows['bucket'].min()) + 60 // BUCKET_SECONDS + 1
+    keys = rows['session_id'].to_numpy() * span + (rows['bucket'] - rows['bucket'].min()).to_numpy()
+    rows['per_minute'] = rolling_minute(keys, rows['scans'].to_numpy())
+
+    peaks = rows.groupby('session_id').agg(peak_bucket=('scans', 'max'), peak_per_minute=('per_minute', 'max'))
+    peaks = peaks.join(sessions.set_index('id'))
+    peaks['location'] = peaks['location'].fillna('').replace('', 'Unspecified')
+    by_room = peaks.groupby('location').agg(
+        sessions=('peak_per_minute', 'size'),
+        peak_bucket=('peak_bucket', 'max'),
+        peak_per_minute=('peak_per_minute', 'max'),
+        p90_per_minute=('peak_per_minute', lambda values: float(np.percentile(values, 90))),
+    )
+    return [
+        {
+            'location': location,
+            'sessions': int(row.sessions),
+            'peak_bucket': int(row.peak_bucket),
+            'peak_per_minute': int(row.peak_per_minute),
+            'p90_per_minute': round(row.p90_per_minute, 1),
+            # Plan for the 90th percentile session, not the single worst one
+            'stations_needed': stations_needed(row.p90_per_minute),
+        }
+        for location, row in by_room.iterrows()
+    ]
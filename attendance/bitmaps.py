@@ -0,0 +1,228 @@
+# attendance/bitmaps.py
+# Per-course attendance bitsets. For each course, CourseIndex fixes an order of
+# its sessions and every student gets a BLOB with one bit per session. Scans
+# set bits as they happen. Campus-wide percentage and streak questions then
+# read a few thousand small blobs and answer them with popcounts and masks
+# over NumPy arrays, instead of joining records against sessions.
+#
+# Session changes that would shift bit positions (an earlier session added,
+# one moved or deleted) flag the index as stale, so scans stop writing into
+# it, and rebuild it from the records once the change has committed.
+from itertools import chain
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from .models import AttendanceBitset, AttendanceRecord, AttendanceSession, CourseIndex, Enrollment, Student
+from .reports import absence_runs
+
+def popcount(array):
+    """Set bits per row of a uint8 matrix"""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(array).sum(axis=1, dtype=np.int64)
+    return np.unpackbits(array, axis=1).sum(axis=1, dtype=np.int64)
+
+def _set_bit(blob, position, present):
+    data = bytearray(blob or b'')
+    byte, bit = divmod(position, 8)
+    if len(data) <= byte:
+        data.extend(bytes(byte + 1 - len(data)))
+    if present:
+        data[byte] |= 1 << bit
+    else:
+        data[byte] &= ~(1 << bit) & 0xFF
+    return bytes(data)
+
+def rebuild_course(course_code):
+    """Rebuild a course's index and bitsets from its records: three reads, then bulk writes"""
+    sessions = list(
+        AttendanceSession.objects.filter(course_code=course_code).order_by('start_time', 'id').values_list('id', 'start_time')
+    )
+    session_ids = [session_id for session_id, _ in sessions]
+    pairs = AttendanceRecord.objects.filter(session_id__in=session_ids).values_list('student_id', 'session_id')
+    pairs = np.fromiter(chain.from_iterable(pairs.iterator(chunk_size=10000)), dtype=np.int64).reshape(-1, 2)
+
+    # Enrolled students get a row even if they never attended
+    roster = Enrollment.objects.filter(course_code=course_code).values_list('student_id', flat=True)
+    students = np.union1d(pairs[:, 0], np.fromiter(roster, dtype=np.int64))
+
+    present = np.zeros((len(students), len(sessions)), dtype=bool)
+    columns = {session_id: column for column, session_id in enumerate(session_ids)}
+    present[np.searchsorted(students, pairs[:, 0]), [columns[session_id] for session_id in pairs[:, 1].tolist()]] = True
+    packed = np.packbits(present, axis=1, bitorder='little')
+
+    with transaction.atomic():
+        AttendanceBitset.objects.filter(course_code=course_code).delete()
+        AttendanceBitset.objects.bulk_create([
+            AttendanceBitset(course_code=course_code, student_id=int(student), bits=row.tobytes())
+            for student, row in zip(students, packed)
+        ], batch_size=2000)
+        index, _ = CourseIndex.objects.update_or_create(course_code=course_code, defaults={
+            'session_ids': session_ids,
+            'session_starts': [start.timestamp() for _, start in sessions],
+            'stale': False,
+        })
+    return index
+
+def _rebuild_if_stale(course_code):
+    # Several edits in one transaction queue several of these; one rebuild does
+    if CourseIndex.objects.filter(course_code=course_code, stale=True).exists():
+        rebuild_course(course_code)
+
+def _invalidate(course_code):
+    CourseIndex.objects.filter(course_code=course_code).update(stale=True)
+    transaction.on_commit(lambda: _rebuild_if_stale(course_code))
+
+def mark(session, student_ids, present=True):
+    """Set (or clear) a session's bit for some students. Called for every scan and
+    bulk edit; does nothing for courses without a current index."""
+    index = CourseIndex.objects.filter(course_code=session.course_code, stale=False).first()
+    if index is None:
+        return
+    try:
+        position = index.session_ids.index(session.id)
+    except ValueError:
+        # Session unknown to the index (created while it was being built)
+        _invalidate(index.course_code)
+        return
+
+    with transaction.atomic():
+        rows = {row.student_id: row for row in AttendanceBitset.objects.filter(
+            course_code=session.course_code, student_id__in=student_ids
+        )}
+        for row in rows.values():
+            row.bits = _set_bit(row.bits, position, present)
+        AttendanceBitset.objects.bulk_update(list(rows.values()), ['bits'])
+        if present:
+            AttendanceBitset.objects.bulk_create([
+                AttendanceBitset(course_code=session.course_code, student_id=student_id, bits=_set_bit(b'', position, True))
+                for student_id in student_ids if student_id not in rows
+            ], ignore_conflicts=True)
+
+def session_changed(session, created=False, deleted=False):
+    """Keep bit positions valid after a session is saved or deleted"""
+    if created:
+        index = CourseIndex.objects.filter(course_code=session.course_code, stale=False).first()
+        if index is None:
+            return
+        start = session.start_time.timestamp()
+        if not index.session_starts or start >= index.session_starts[-1]:
+            # The usual case: the newest session goes at the end and no bits move
+            index.session_ids.append(session.id)
+            index.session_starts.append(start)
+            index.save(update_fields=['session_ids', 'session_starts', 'built_at'])
+        else:
+            _invalidate(index.course_code)
+        return
+
+    # Edits and deletes are rare; the index table has one small row per course
+    moved_in = not deleted
+    for index in CourseIndex.objects.filter(stale=False):
+        if session.id not in index.session_ids:
+            continue
+        position = index.session_ids.index(session.id)
+        if deleted or index.course_code != session.course_code or index.session_starts[position] != session.start_time.timestamp():
+            _invalidate(index.course_code)
+        elif index.course_code == session.course_code:
+            moved_in = False
+    if moved_in:
+        # Course code changed: new to that course's index
+        session_changed(session, created=True)
+
+def _load(course_codes):
+    """{course_code: CourseIndex}, building indexes a course has never had first.
+    Stale ones are normally rebuilt right after the session change that made them
+    stale; one still stale here had its rebuild fail, and it is retried."""
+    indexes = {index.course_code: index for index in CourseIndex.objects.filter(course_code__in=course_codes)}
+    for course_code in course_codes:
+        if course_code not in indexes or indexes[course_code].stale:
+            indexes[course_code] = rebuild_course(course_code)
+    return indexes
+
+def at_risk(course_codes, below=75.0, streak=3, now=None, sessions_queryset=None):
+    """Students under `below` percent, or with `streak` or more consecutive
+    absences, in any of the courses. Sessions that haven't started don't count,
+    nor do sessions outside `sessions_queryset` when one is given."""
+    now = (now or timezone.now()).timestamp()
+    course_codes = sorted(set(course_codes))
+    indexes = _load(course_codes)
+    counted = None
+    if sessions_queryset is not None:
+        counted = set(sessions_queryset.filter(course_code__in=course_codes).values_list('id', flat=True))
+
+    enrolled = {}
+    for course_code, student_id in Enrollment.objects.filter(course_code__in=course_codes).values_list('course_code', 'student_id'):
+        enrolled.setdefault(course_code, set()).add(student_id)
+    bitsets = {}
+    for course_code, student_id, bits in AttendanceBitset.objects.filter(course_code__in=course_codes).values_list(
+        'course_code', 'student_id', 'bits'
+    ).iterator(chunk_size=10000):
+        bitsets.setdefault(course_code, []).append((student_id, bytes(bits)))
+    # Students enrolled since the last rebuild have no row yet: all absent
+    for course_code, roster in enrolled.items():
+        indexed = {student_id for student_id, _ in bitsets.get(course_code, [])}
+        bitsets.setdefault(course_code, []).extend((student_id, b'') for student_id in sorted(roster - indexed))
+
+    flagged = []
+    for course_code in course_codes:
+        index = indexes[course_code]
+        sessions = len(index.session_ids)
+        in_scope = np.ones(sessions, dtype=bool)
+        if counted is not None:
+            in_scope = np.array([session_id in counted for session_id in index.session_ids], dtype=bool)
+        held = (np.array(index.session_starts) <= now) & in_scope
+        held_count = int(held.sum())
+        rows = bitsets.get(course_code, [])
+        if not held_count or not rows:
+            continue
+
+        width = (sessions + 7) // 8
+        students = np.array([student_id for student_id, _ in rows], dtype=np.int64)
+        packed = np.frombuffer(b''.join(bits[:width].ljust(width, b'\0') for _, bits in rows), dtype=np.uint8)
+        packed = packed.reshape(len(rows), width)
+        # As in CourseMatrix: the roster plus anyone who came to a counted session,
+        # not students who only ever attended someone else's
+        keep = np.isin(students, list(enrolled.get(course_code, ())))
+        keep |= (packed & np.packbits(in_scope, bitorder='little')).any(axis=1)
+        students, packed = students[keep], packed[keep]
+        held_mask = np.packbits(held, bitorder='little')
+
+        attended = popcount(packed & held_mask)
+        percentage = 100.0 * attended / held_count
+        # Absences in held sessions only (other columns dropped, so they can't
+        # break a run), then the longest run of them
+        absent = ~np.unpackbits(packed, axis=1, bitorder='little', count=sessions).astype(bool)
+        longest = absence_runs(absent[:, held]).max(axis=1)
+
+        hits = np.flatnonzero((percentage < below) | (longest >= streak))
+        flagged.extend(
+            (course_code, int(students[i]), int(attended[i]), held_count, round(float(percentage[i]), 1), int(longest[i]))
+            for i in hits
+        )
+
+    names = {
+        student['id']: student for student in Student.objects.filter(id__in={row[1] for row in flagged}).values(
+            'id', 'student_id', 'user__first_name', 'user__last_name', 'department'
+        )
+    }
+    return [
+        {
+            'course_code': course_code,
+            'student_id': names[pk]['student_id'],
+            'name': f"{names[pk]['user__first_name']} {names[pk]['user__last_name']}".strip(),
+            'department': names[pk]['department'],
+            'attended': attended,
+            'held': held_count,
+            'percentage': percentage,
+            'longest_absence_streak': longest,
+        }
+        for course_code, pk, attended, held_count, percentage, longest in flagged
+        if pk in names
+    ]
+
+def course_codes_for(user):
+    sessions = AttendanceSession.objects.all()
+    if not user.is_superuser:
+        sessions = sessions.filter(created_by=user)
+    return list(sessions.values_list('course_code', flat=True).distinct())
@@ -0,0 +1,72 @@
+# attendance/corrections.py
+# Bulk manual marking for when scanning isn't possible. Each request is a small
+# fixed set of queries however many students it names: resolve the IDs, find who
+# is already present, one bulk insert or one filtered delete, one bulk audit insert.
+# Side effects the record signals would have per row are applied once per batch.
+import uuid
+
+from django.db import transaction
+
+from . import bitmaps, versions
+from .arrivals import forget_session_arrivals
+from .models import AttendanceEdit, AttendanceRecord, Student
+from .signals import batched_record_changes
+
+MAX_STUDENT_IDS = 5000
+
+def apply_bulk_edit(session, student_ids, action, user, reason=''):
+    """Mark ('mark') or unmark ('unmark') students of a session.
+    Returns {'changed': [...], 'unchanged': [...], 'unknown': [...]} of student IDs."""
+    students = dict(Student.objects.filter(student_id__in=student_ids).values_list('student_id', 'id'))
+    unknown = [student_id for student_id in student_ids if student_id not in students]
+
+    with transaction.atomic():
+        present = set(AttendanceRecord.objects.filter(
+            session=session, student_id__in=students.values()
+        ).values_list('student_id', flat=True))
+
+        record_ids = {}
+        if action == 'mark':
+            missing = [pk for pk in students.values() if pk not in present]
+            # ignore_conflicts covers a scan landing between the lookup and the insert
+            AttendanceRecord.objects.bulk_create(
+                [AttendanceRecord(session=session, student_id=pk, source='manual') for pk in missing],
+                ignore_conflicts=True,
+            )
+            # Those students were present after all; only the rows written count
+            inserted = set(AttendanceRecord.objects.filter(
+                session=session, student_id__in=missing, source='manual'
+            ).values_list('student_id', flat=True))
+            changed = [student_id for student_id, pk in students.items() if pk in inserted]
+        else:
+            changed = [student_id for student_id, pk in students.items() if pk in present]
+            records = AttendanceRecord.objects.filter(session=session, student_id__in=[students[s] for s in changed])
+            record_ids = dict(records.values_list('student_id', 'id'))
+            with batched_record_changes():
+                records.delete()
+            forget_session_arrivals(session.id)
+
+        batch = uuid.uuid4()
+        AttendanceEdit.objects.bulk_create([
+            AttendanceEdit(
+                batch=batch, session=session, student_id=students[student_id],
+                action=action, edited_by=user, reason=reason, record_id=record_ids.get(students[student_id]),
+            )
+            for student_id in changed
+        ])
+
+    if changed:
+        # bulk_create skips the AttendanceRecord signals, and the delete skipped their work
+        versions.bump(
+            versions.records_key(session.id),
+            versions.admin_dashboard_key(session.created_by_id),
+            *(versions.student_key(students[student_id]) for student_id in changed),
+        )
+        bitmaps.mark(session, [students[student_id] for student_id in changed], present=action == 'mark')
+
+    changed_set = set(changed)
+    return {
+        'changed': changed,
+        'unchanged': [student_id for student_id in students if student_id not in changed_set],
+        'unknown': unknown,
+    }
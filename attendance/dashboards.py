@@ -0,0 +1,84 @@
+# attendance/dashboards.py
+# Cached session lists for the dashboards. Keys carry a version stamp shared by
+# all workers (versions.py), so saving or deleting a session (or a record in
+# it) in any process moves every reader to a fresh key. Entries also expire
+# when a listed session starts or ends, since that changes the lists without
+# any write.
+#
+# The views read from the replica when it is fresh enough. Lists are then built
+# from the snapshot and keyed by the stamps in that same snapshot, so a cached
+# list always matches its key (see versions.snapshot).
+import math
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils import timezone
+
+from . import versions
+from .models import AttendanceRecord, AttendanceSession
+
+def dashboard_ttl():
+    return getattr(settings, 'ATTENDANCE_DASHBOARD_CACHE_TTL', 300)
+
+def _expiry(sessions, now):
+    ttl = dashboard_ttl()
+    upcoming = [moment for session in sessions for moment in (session.start_time, session.end_time) if moment > now]
+    if upcoming:
+        ttl = min(ttl, (min(upcoming) - now).total_seconds())
+    return now + timedelta(seconds=ttl)
+
+def _cached(key, build):
+    """Returns (value, seconds until it expires). `build(now)` returns (value, sessions it lists)."""
+    now = timezone.now()
+    entry = cache.get(key)
+    if entry is None or entry[1] <= now:
+        value, sessions = build(now)
+        expires_at = _expiry(sessions, now)
+        entry = (value, expires_at)
+        cache.set(key, entry, timeout=math.ceil((expires_at - now).total_seconds()))
+    return entry[0], max(1, math.ceil((entry[1] - now).total_seconds()))
+
+def active_sessions():
+    """Active sessions shown to every student, as (sessions, seconds the list
+    stays valid, the version it was cached under)"""
+    db, [version] = versions.snapshot(versions.SESSIONS_KEY)
+
+    def build(now):
+        sessions = list(AttendanceSession.objects.using(db).filter(is_active=True, end_time__gte=now))
+        return sessions, sessions
+
+    sessions, ttl = _cached(f'attendance:active_sessions:{version}', build)
+    return sessions, ttl, version
+
+def admin_session_lists(user):
+    """{'today_sessions': [...], 'active_sessions': [...]} for one admin, with attendance counts"""
+    today = timezone.now().date()
+    db, [version] = versions.snapshot(versions.admin_dashboard_key(user.pk))
+
+    def build(now):
+        sessions = AttendanceSession.objects.using(db).filter(created_by=user).annotate(
+            attendance_count=Count('records')
+        )
+        lists = {
+            'today_sessions': list(sessions.filter(start_time__date=today)),
+            'active_sessions': list(sessions.filter(is_active=True, end_time__gte=now)),
+        }
+        return lists, lists['today_sessions'] + lists['active_sessions']
+
+    lists, _ = _cached(f'attendance:admin:{user.pk}:sessions:{today}:{version}', build)
+    return lists
+
+def student_history(student):
+    """A student's records, newest first, with their sessions"""
+    # Session edits show up in the history too, so both stamps are in the key
+    db, stamps = versions.snapshot(versions.student_key(student.pk), versions.SESSIONS_KEY)
+    key = f'attendance:student:{student.pk}:history:{stamps[0]}:{stamps[1]}'
+    records = cache.get(key)
+    if records is None:
+        records = list(
+            AttendanceRecord.objects.using(db).filter(student=student).select_related('session').order_by('-timestamp')
+        )
+        cache.set(key, records, timeout=dashboard_ttl())
+    return records
@@ -1,6 +1,14 @@
 # attendance/decorators.py
-from django.http import HttpResponseForbidden
+from django.db import connections
+from django.http import HttpResponseForbidden, JsonResponse
 from functools import wraps
+import math
+
+from .middleware import last_write_time
+from .replica import REPLICA_ALIAS, replica_usable
+from .routers import use_replica
+from .signals import session_owner
+from .throttling import check_throttle
 
 def student_required(view_func):
     @wraps(view_func)
@@ -20,4 +28,57 @@ def admin_required(view_func):
         if not hasattr(request.user, 'admin_profile'):
             return HttpResponseForbidden("Admin access required")
         return view_func(request, *args, **kwargs)
-    return _wrapped_view
\ No newline at end of file
+    return _wrapped_view
+
+def throttle(scope, session_kwarg=None):
+    """Token-bucket rate limit per user, and per attendance session when the
+    view's `session_kwarg` names one of the user's own sessions; see throttling.py"""
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            session_id = kwargs.get(session_kwarg) if session_kwarg else None
+            # Someone else's session isn't charged (the view turns them away), so
+            # other admins can't drain the bucket of a session that is being scanned
+            if session_id is not None and session_owner(session_id) != request.user.pk:
+                session_id = None
+            wait = check_throttle(request, scope, session_id)
+            if wait:
+                response = JsonResponse(
+                    {'success': False, 'message': 'Too many requests, please slow down.'},
+                    status=429
+                )
+                response['Retry-After'] = str(math.ceil(wait))
+                return response
+            return view_func(request, *args, **kwargs)
+        return _wrapped_view
+    return decorator
+
+def _on_replica(content):
+    # Streamed rows are fetched after the view returns, so re-enter replica routing
+    previous = use_replica.get()
+    use_replica.set(True)
+    try:
+        yield from content
+    finally:
+        use_replica.set(previous)
+        connections[REPLICA_ALIAS].close()
+
+def reads_from_replica(view_func):
+    """Route the view's attendance reads to the read replica when it is fresh enough"""
+    @wraps(view_func)
+    def _wrapped_view(request, *args, **kwargs):
+        if not replica_usable(last_write_time(request)):
+            return view_func(request, *args, **kwargs)
+        
+        token = use_replica.set(True)
+        try:
+            response = view_func(request, *args, **kwargs)
+        finally:
+            use_replica.reset(token)
+        
+        # Snapshots are swapped in by file replace; don't keep reading an old one
+        connections[REPLICA_ALIAS].close()
+        if response.streaming:
+            response.streaming_content = _on_replica(response.streaming_content)
+        return response
+    return _wrapped_view
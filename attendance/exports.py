@@ -0,0 +1,195 @@
+# attendance/exports.py
+# Background export jobs. Exports run on a small in-process thread pool and
+# write their result under MEDIA_ROOT/exports/, where it is kept until the
+# job expires. Identical requests made while one is still queued or running
+# share that job; a conditional unique constraint keeps that true across worker
+# processes. A finished export is never handed out again, since date and course
+# ranges can be open-ended and new records would be missing from it.
+import csv
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from .models import AttendanceRecord, ExportJob
+
+EXPORT_COLUMNS = [
+    'Course', 'Session', 'Session Start', 'Student ID', 'Name', 'Department', 'Year',
+    'Timestamp', 'IP Address', 'Device Info',
+]
+PROGRESS_EVERY = 500
+
+_executor = None
+_executor_lock = threading.Lock()
+_submit_lock = threading.Lock()
+
+def export_dir():
+    return Path(settings.MEDIA_ROOT) / 'exports'
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'ATTENDANCE_EXPORT_WORKERS', 2),
+                thread_name_prefix='export'
+            )
+        return _executor
+
+def normalize_params(data):
+    """Validated, canonical export parameters from a request body. Raises ValueError."""
+    params = {
+        'session_ids': sorted({int(session_id) for session_id in data.get('session_ids') or []}),
+        'course_codes': sorted({str(code).strip() for code in data.get('course_codes') or [] if str(code).strip()}),
+        'start': data.get('start') or None,
+        'end': data.get('end') or None,
+    }
+    for key in ('start', 'end'):
+        if params[key]:
+            datetime.strptime(params[key], '%Y-%m-%d')
+    if not (params['session_ids'] or params['course_codes'] or params['start']):
+        raise ValueError('Choose sessions, course codes or a start date')
+    return params
+
+def job_records(job):
+    params = job.params
+    records = AttendanceRecord.objects.filter(session__created_by=job.requested_by)
+    if params['session_ids']:
+        records = records.filter(session_id__in=params['session_ids'])
+    if params['course_codes']:
+        records = records.filter(session__course_code__in=params['course_codes'])
+    tz = timezone.get_current_timezone()
+    if params['start']:
+        start = datetime.combine(datetime.strptime(params['start'], '%Y-%m-%d'), time.min)
+        records = records.filter(session__start_time__gte=timezone.make_aware(start, tz))
+    if params['end']:
+        end = datetime.combine(datetime.strptime(params['end'], '%Y-%m-%d'), time.max)
+        records = records.filter(session__start_time__lte=timezone.make_aware(end, tz))
+    return records.select_related('session', 'student', 'student__user', 'device').order_by(
+        'session__start_time', 'session_id', 'id'
+    )
+
+def record_row(record):
+    return [
+        record.session.course_code,
+        record.session.name,
+        record.session.start_time.strftime('%Y-%m-%d %H:%M'),
+        record.student.student_id,
+        record.student.user.get_full_name(),
+        record.student.department,
+        record.student.year,
+        record.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+        record.ip_address or 'N/A',
+        record.device_info,
+    ]
+
+def _write_rows(job, path, rows):
+    def report(done):
+        ExportJob.objects.filter(pk=job.pk).update(progress=done, updated_at=timezone.now())
+
+    done = 0
+    if job.export_format == 'excel':
+        from openpyxl import Workbook
+
+        # Write-only mode streams rows to disk instead of holding the sheet in memory
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet('Attendance')
+        sheet.append(EXPORT_COLUMNS)
+        for row in rows:
+            sheet.append(row)
+            done += 1
+            if done % PROGRESS_EVERY == 0:
+                report(done)
+        workbook.save(path)
+    else:
+        with open(path, 'w', newline='') as output:
+            writer = csv.writer(output)
+            writer.writerow(EXPORT_COLUMNS)
+            for row in rows:
+                writer.writerow(row)
+                done += 1
+                if done % PROGRESS_EVERY == 0:
+                    report(done)
+    return done
+
+def run_export_job(job_id):
+    job = ExportJob.objects.select_related('requested_by').get(pk=job_id)
+    if job.status != 'pending':
+        # Given up on as stale while it waited in the queue
+        return
+    extension = 'xlsx' if job.export_format == 'excel' else 'csv'
+    path = export_dir() / f'attendance_export_{job.pk}.{extension}'
+    tmp_path = path.with_suffix(f'.{extension}.tmp')
+
+    try:
+        records = job_records(job)
+        job.total = records.count()
+        job.status = 'running'
+        job.save(update_fields=['total', 'status', 'updated_at'])
+
+        export_dir().mkdir(parents=True, exist_ok=True)
+        rows = (record_row(record) for record in records.iterator(chunk_size=2000))
+        job.progress = _write_rows(job, tmp_path, rows)
+        os.replace(tmp_path, path)
+
+        job.file_path = str(path)
+        job.status = 'done'
+    except Exception as e:
+        tmp_path.unlink(missing_ok=True)
+        job.status = 'failed'
+        job.error = str(e)
+    finally:
+        job.finished_at = timezone.now()
+        job.expires_at = job.finished_at + timedelta(seconds=getattr(settings, 'ATTENDANCE_EXPORT_TTL', 86400))
+        job.save()
+        # Worker threads get their own connection; don't leave it open
+        connection.close()
+
+def purge_expired_exports():
+    for job in ExportJob.objects.filter(expires_at__lt=timezone.now()):
+        if job.file_path:
+            Path(job.file_path).unlink(missing_ok=True)
+        job.delete()
+
+def submit_export(user, export_format, params):
+    """Return (job, created). An identical pending or running job for the same
+    user is reused instead of starting a new one."""
+    fingerprint = hashlib.sha256(
+        json.dumps({'user': user.pk, 'format': export_format, 'params': params}, sort_keys=True).encode()
+    ).hexdigest()
+    now = timezone.now()
+    # Jobs that stopped reporting progress died with their worker
+    alive_since = now - timedelta(seconds=getattr(settings, 'ATTENDANCE_EXPORT_STALE_AFTER', 600))
+
+    with _submit_lock:
+        purge_expired_exports()
+        # Free the fingerprint held by jobs that died with their worker
+        ExportJob.objects.filter(
+            fingerprint=fingerprint, status__in=['pending', 'running'], updated_at__lt=alive_since
+        ).update(status='failed', error='Export stopped reporting progress', finished_at=now, expires_at=now)
+
+        existing = ExportJob.objects.filter(fingerprint=fingerprint, status__in=['pending', 'running']).first()
+        if existing:
+            return existing, False
+
+        try:
+            with transaction.atomic():
+                job = ExportJob.objects.create(
+                    requested_by=user,
+                    fingerprint=fingerprint,
+                    export_format=export_format,
+                    params=params,
+                )
+        except IntegrityError:
+            # Another worker process created the same job just now
+            return ExportJob.objects.get(fingerprint=fingerprint, status__in=['pending', 'running']), False
+    get_executor().submit(run_export_job, job.pk)
+    return job, True
+
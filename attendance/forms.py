@@ -1,8 +1,12 @@
 # attendance/forms.py
+import csv
+import re
+
 from django import forms
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib.auth.models import User
 from .models import Student, AdminProfile, AttendanceSession
+from .corrections import MAX_STUDENT_IDS
 from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Layout, Submit, Row, Column, Field
 
@@ -215,4 +219,90 @@ class QRScanForm(forms.Form):
         super().__init__(*args, **kwargs)
         self.helper = FormHelper()
         self.helper.form_method = 'post'
-        self.helper.form_class = 'form-horizontal'
\ No newline at end of file
+        self.helper.form_class = 'form-horizontal'
+
+def split_student_ids(text):
+    """Pull student IDs out of pasted text: one per line, or separated by commas/tabs/spaces.
+    A pasted CSV export with a 'Student ID' header (the absentee and matrix exports
+    have one) gives just that column. Anything else is split on every separator, so
+    stray fields come back to the admin as unknown IDs rather than being dropped."""
+    lines = [line for line in text.splitlines() if line.strip()]
+    if not lines:
+        return []
+    rows = csv.reader(lines, delimiter='\t' if '\t' in lines[0] else ',')
+    header = [cell.strip().lower().replace('_', ' ') for cell in next(rows)]
+    if 'student id' in header:
+        column = header.index('student id')
+        student_ids = [row[column].strip() for row in rows if len(row) > column]
+    else:
+        student_ids = re.split(r'[\s,]+', text)
+    return [student_id for student_id in dict.fromkeys(student_ids) if student_id]
+
+class EnrollmentForm(forms.Form):
+    ACTIONS = [
+        ('enroll', 'Enroll'),
+        ('unenroll', 'Unenroll'),
+    ]
+    
+    course_code = forms.CharField(
+        max_length=20,
+        widget=forms.TextInput(attrs={'placeholder': 'e.g., CS101'})
+    )
+    student_ids = forms.CharField(
+        widget=forms.Textarea(attrs={'rows': 8, 'placeholder': 'One student ID per line, or paste a roster'})
+    )
+    action = forms.ChoiceField(choices=ACTIONS, initial='enroll')
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.helper = FormHelper()
+        self.helper.form_method = 'post'
+        self.helper.layout = Layout(
+            'course_code',
+            'student_ids',
+            'action',
+            Submit('submit', 'Apply', css_class='btn-primary')
+        )
+    
+    def clean_student_ids(self):
+        student_ids = split_student_ids(self.cleaned_data['student_ids'])
+        if not student_ids:
+            raise forms.ValidationError('Enter at least one student ID.')
+        return student_ids
+
+class BulkAttendanceForm(forms.Form):
+    ACTIONS = [
+        ('mark', 'Mark present'),
+        ('unmark', 'Mark absent'),
+    ]
+    
+    student_ids = forms.CharField(
+        widget=forms.Textarea(attrs={'rows': 10, 'placeholder': 'One student ID per line, or paste a roster'})
+    )
+    action = forms.ChoiceField(choices=ACTIONS, initial='mark')
+    reason = forms.CharField(
+        max_length=200,
+        required=False,
+        widget=forms.TextInput(attrs={'placeholder': 'e.g., Scanner laptop failed'})
+    )
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.helper = FormHelper()
+        self.helper.form_method = 'post'
+        self.helper.layout = Layout(
+            'student_ids',
+            Row(
+                Column('action', css_class='form-group col-md-4'),
+                Column('reason', css_class='form-group col-md-8'),
+            ),
+            Submit('submit', 'Apply', css_class='btn-primary')
+        )
+    
+    def clean_student_ids(self):
+        student_ids = split_student_ids(self.cleaned_data['student_ids'])
+        if not student_ids:
+            raise forms.ValidationError('Enter at least one student ID.')
+        if len(student_ids) > MAX_STUDENT_IDS:
+            raise forms.ValidationError(f'At most {MAX_STUDENT_IDS} student IDs per request.')
+        return student_ids
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from attendance.bitmaps import rebuild_course
+from attendance.models import AttendanceSession, CourseIndex
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-course attendance bitsets from attendance records'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', action='append', dest='courses',
+                            help='Course code to rebuild (repeatable); default is every course')
+        parser.add_argument('--stale', action='store_true', help='Only courses whose index is stale or missing')
+
+    def handle(self, *args, **options):
+        course_codes = options['courses'] or sorted(
+            AttendanceSession.objects.values_list('course_code', flat=True).distinct()
+        )
+        if options['stale']:
+            current = set(CourseIndex.objects.filter(stale=False).values_list('course_code', flat=True))
+            course_codes = [course_code for course_code in course_codes if course_code not in current]
+
+        started = time.monotonic()
+        for course_code in course_codes:
+            index = rebuild_course(course_code)
+            self.stdout.write(f'  {course_code}: {len(index.session_ids)} sessions')
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {len(course_codes)} course indexes in {time.monotonic() - started:.1f}s'
+        ))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from attendance.replica import refresh_replica, replica_path
+
+class Command(BaseCommand):
+    help = 'Refresh the read-replica snapshot of the primary database'
+
+    def handle(self, *args, **options):
+        elapsed = refresh_replica()
+        self.stdout.write(self.style.SUCCESS(f'Replica {replica_path()} refreshed in {elapsed:.2f}s'))
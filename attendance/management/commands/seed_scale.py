@@ -0,0 +1,257 @@
+import random
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from attendance.models import (
+    AdminProfile, AttendanceRecord, AttendanceSession, Device, Enrollment, Student,
+)
+
+DEPARTMENTS = [
+    ('CS', 'Computer Science'),
+    ('EE', 'Electrical Engineering'),
+    ('ME', 'Mechanical Engineering'),
+    ('MA', 'Mathematics'),
+    ('PH', 'Physics'),
+    ('CH', 'Chemistry'),
+    ('BI', 'Biology'),
+    ('EC', 'Economics'),
+]
+FIRST_NAMES = ['Aarav', 'Maya', 'Liam', 'Zara', 'Noah', 'Ife', 'Mei', 'Omar', 'Sofia', 'Ravi', 'Elena', 'Kofi']
+LAST_NAMES = ['Sharma', 'Okafor', 'Chen', 'Garcia', 'Smith', 'Khan', 'Novak', 'Tanaka', 'Silva', 'Mensah']
+BROWSERS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{v}.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.{v} Safari/605.1.15',
+    'Mozilla/5.0 (X11; Linux x86_64; rv:{v}.0) Gecko/20100101 Firefox/{v}.0',
+]
+SESSION_TYPES = ['lecture', 'lecture', 'lecture', 'lab', 'tutorial']
+
+def fmt(value):
+    # Django stores aware datetimes in SQLite as naive UTC text
+    return value.astimezone(dt_timezone.utc).strftime('%Y-%m-%d %H:%M:%S.%f')
+
+class Command(BaseCommand):
+    help = 'Generate a large synthetic term of students, sessions and attendance for scale testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=5000)
+        parser.add_argument('--admins', type=int, default=40)
+        parser.add_argument('--courses', type=int, default=60)
+        parser.add_argument('--weeks', type=int, default=15)
+        parser.add_argument('--sessions-per-week', type=int, default=2)
+        parser.add_argument('--courses-per-student', type=int, default=5)
+        parser.add_argument('--term-start', help='YYYY-MM-DD, defaults to the Monday --weeks weeks ago')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=50000)
+
+    def handle(self, *args, **options):
+        if Student.objects.filter(student_id__startswith='SCL').exists():
+            raise CommandError('Seed data already present (student IDs starting with SCL)')
+
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        started = time.monotonic()
+
+        if options['term_start']:
+            term_start = datetime.strptime(options['term_start'], '%Y-%m-%d').replace(tzinfo=dt_timezone.utc)
+        else:
+            today = datetime.now(dt_timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+            term_start = today - timedelta(days=today.weekday(), weeks=options['weeks'])
+
+        with connection.cursor() as cursor:
+            # Seeding only: skip fsyncs for this connection
+            cursor.execute('PRAGMA synchronous = OFF')
+
+        with transaction.atomic():
+            admin_ids = self.create_admins(options['admins'])
+            students = self.create_students(options['students'])
+            devices = self.create_devices()
+            courses = self.create_courses(options['courses'], admin_ids)
+            rosters = self.enroll(students, courses, options['courses_per_student'])
+            sessions = self.create_sessions(courses, term_start, options['weeks'], options['sessions_per_week'])
+
+        records = self.create_records(students, sessions, rosters, devices)
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {len(students)} students, {len(sessions)} sessions and {records} attendance records '
+            f'in {time.monotonic() - started:.1f}s'
+        ))
+
+    def next_id(self, model):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COALESCE(MAX(id), 0) FROM {model._meta.db_table}')
+            return cursor.fetchone()[0] + 1
+
+    def insert(self, model, columns, rows):
+        """executemany in batches; returns the number of rows written"""
+        sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            model._meta.db_table, ', '.join(columns), ', '.join(['%s'] * len(columns))
+        )
+        written = 0
+        batch = []
+        with connection.cursor() as cursor:
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= self.batch_size:
+                    cursor.executemany(sql, batch)
+                    written += len(batch)
+                    batch = []
+            if batch:
+                cursor.executemany(sql, batch)
+                written += len(batch)
+        return written
+
+    def create_users(self, prefix, count, is_staff):
+        # Hashing is the slow part of creating users; everyone shares one hash
+        password = make_password('password', salt='seedscale')
+        joined = fmt(datetime.now(dt_timezone.utc))
+        first_id = self.next_id(User)
+        self.insert(User, [
+            'id', 'password', 'is_superuser', 'username', 'first_name', 'last_name',
+            'email', 'is_staff', 'is_active', 'date_joined',
+        ], (
+            (first_id + n, password, False, f'{prefix}{n:06d}',
+             self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES),
+             f'{prefix}{n:06d}@example.edu', is_staff, True, joined)
+            for n in range(count)
+        ))
+        return list(range(first_id, first_id + count))
+
+    def create_admins(self, count):
+        user_ids = self.create_users('seed_admin_', count, True)
+        self.insert(AdminProfile, [
+            'user_id', 'department', 'can_create_sessions', 'can_export_data', 'can_manage_students',
+        ], ((user_id, DEPARTMENTS[n % len(DEPARTMENTS)][1], True, True, True) for n, user_id in enumerate(user_ids)))
+        return user_ids
+
+    def create_students(self, count):
+        """Returns (student pk, department index, attendance propensity) per student"""
+        user_ids = self.create_users('seed_student_', count, False)
+        first_id = self.next_id(Student)
+        created = fmt(datetime.now(dt_timezone.utc))
+        students = [
+            # Most students attend ~85% of the time, with a long tail of habitual absentees
+            (first_id + n, self.rng.randrange(len(DEPARTMENTS)), self.rng.betavariate(6, 1.2))
+            for n in range(count)
+        ]
+        self.insert(Student, [
+            'id', 'user_id', 'student_id', 'department', 'year', 'phone', 'created_at',
+        ], (
+            (pk, user_id, f'SCL{n:07d}', DEPARTMENTS[dept][1], self.rng.randint(1, 4), '', created)
+            for n, ((pk, dept, _), user_id) in enumerate(zip(students, user_ids))
+        ))
+        self.stdout.write(f'  students: {count}')
+        return students
+
+    def create_devices(self):
+        first_id = self.next_id(Device)
+        agents = [browser.format(v=version) for browser in BROWSERS for version in range(110, 122)]
+        seen = fmt(datetime.now(dt_timezone.utc))
+        self.insert(Device, ['id', 'ua_hash', 'user_agent', 'first_seen'], (
+            (first_id + n, Device.hash_user_agent(agent), agent, seen) for n, agent in enumerate(agents)
+        ))
+        return list(range(first_id, first_id + len(agents)))
+
+    def create_courses(self, count, admin_ids):
+        """Returns (course code, department index, lecturer user id) per course"""
+        return [
+            (f'{DEPARTMENTS[n % len(DEPARTMENTS)][0]}{100 + n // len(DEPARTMENTS)}',
+             n % len(DEPARTMENTS), admin_ids[n % len(admin_ids)])
+            for n in range(count)
+        ]
+
+    def enroll(self, students, courses, per_student):
+        by_department = {}
+        for n, (_, dept, _) in enumerate(courses):
+            by_department.setdefault(dept, []).append(n)
+
+        rosters = {n: [] for n in range(len(courses))}
+        for pk, dept, propensity in students:
+            # Mostly courses of their own department, plus electives from anywhere
+            home = by_department.get(dept, [])
+            picks = set(self.rng.sample(home, min(len(home), max(1, per_student - 1))))
+            while len(picks) < min(per_student, len(courses)):
+                picks.add(self.rng.randrange(len(courses)))
+            for course in picks:
+                rosters[course].append((pk, propensity))
+
+        enrolled = fmt(datetime.now(dt_timezone.utc))
+        written = self.insert(Enrollment, ['course_code', 'student_id', 'enrolled_at'], (
+            (courses[course][0], pk, enrolled) for course, roster in rosters.items() for pk, _ in roster
+        ))
+        self.stdout.write(f'  enrollments: {written}')
+        return rosters
+
+    def create_sessions(self, courses, term_start, weeks, per_week):
+        """Returns (session pk, course index, start, duration minutes, week) per session"""
+        first_id = self.next_id(AttendanceSession)
+        sessions = []
+        rows = []
+        for course, (code, dept, lecturer) in enumerate(courses):
+            days = sorted(self.rng.sample(range(5), min(per_week, 5)))
+            hour = self.rng.choice([8, 9, 10, 11, 13, 14, 15, 16])
+            room = f'Room {self.rng.randint(100, 450)}'
+            for week in range(weeks):
+                for day in days:
+                    pk = first_id + len(sessions)
+                    start = term_start + timedelta(weeks=week, days=day, hours=hour)
+                    kind = 'exam' if week == weeks - 1 else self.rng.choice(SESSION_TYPES)
+                    duration = 120 if kind in ('lab', 'exam') else 60
+                    sessions.append((pk, course, start, duration, week))
+                    rows.append((
+                        pk, f'{code} {kind.title()} W{week + 1}', code, kind, lecturer,
+                        fmt(start), fmt(start + timedelta(minutes=duration)), True, room, fmt(start - timedelta(days=7)),
+                    ))
+        self.insert(AttendanceSession, [
+            'id', 'name', 'course_code', 'session_type', 'created_by_id',
+            'start_time', 'end_time', 'is_active', 'location', 'created_at',
+        ], rows)
+        self.stdout.write(f'  sessions: {len(sessions)}')
+        return sessions
+
+    def create_records(self, students, sessions, rosters, devices):
+        rng = self.rng
+        weeks = max(session[4] for session in sessions) + 1 if sessions else 1
+
+        def rows():
+            for pk, course, start, duration, week in sessions:
+                # Attendance sags through the term and recovers for the exam
+                session_factor = 1.0 if week == weeks - 1 else 1.0 - 0.15 * week / weeks
+                session_factor *= rng.uniform(0.9, 1.05)
+                scanner_ip = f'10.{course % 250}.{week % 250}.{rng.randint(2, 250)}'
+                device = rng.choice(devices)
+                for student, propensity in rosters[course]:
+                    if rng.random() >= propensity * session_factor:
+                        continue
+                    # Most arrive in the first few minutes, some are late
+                    offset = min(max(rng.gauss(120, 150), -300), duration * 60)
+                    scanned = fmt(start + timedelta(seconds=offset))
+                    yield (student, pk, scanned, scanner_ip, device, scanned, 'scan')
+
+        written = 0
+        batch_rows = rows()
+        while True:
+            # One transaction per few batches keeps the journal small
+            with transaction.atomic():
+                count = self.insert(AttendanceRecord, [
+                    'student_id', 'session_id', 'timestamp', 'ip_address', 'device_id', 'updated_at', 'source',
+                ], _take(batch_rows, self.batch_size * 4))
+            if not count:
+                break
+            written += count
+            self.stdout.write(f'  attendance records: {written}')
+        return written
+
+def _take(iterator, count):
+    for _ in range(count):
+        try:
+            yield next(iterator)
+        except StopIteration:
+            return
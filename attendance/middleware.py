@@ -0,0 +1,31 @@
+# attendance/middleware.py
+import time
+
+from .replica import max_lag
+
+LAST_WRITE_COOKIE = 'attendance_last_write'
+
+def last_write_time(request):
+    try:
+        return float(request.COOKIES[LAST_WRITE_COOKIE])
+    except (KeyError, ValueError):
+        return None
+
+class ReadYourWritesMiddleware:
+    """Remembers when a user last wrote something, so replica-routed views send
+    that user to the primary until the replica snapshot has caught up."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (request.method not in ('GET', 'HEAD', 'OPTIONS')
+                and response.status_code < 400
+                and request.user.is_authenticated):
+            # Once older than the staleness bound any usable snapshot is newer anyway
+            response.set_cookie(
+                LAST_WRITE_COOKIE, f'{time.time():.3f}',
+                max_age=max_lag(), httponly=True, samesite='Lax'
+            )
+        return response
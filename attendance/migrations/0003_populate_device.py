@@ -0,0 +1,61 @@
+# Moves AttendanceRecord.device_info strings into the Device table in pk batches
+
+import hashlib
+
+from django.db import migrations, transaction
+
+BATCH_SIZE = 5000
+
+
+def populate_device(apps, schema_editor):
+    Device = apps.get_model('attendance', 'Device')
+    AttendanceRecord = apps.get_model('attendance', 'AttendanceRecord')
+    db = schema_editor.connection.alias
+    records = AttendanceRecord.objects.using(db)
+    devices = {}
+    
+    last_pk = 0
+    while True:
+        batch = list(
+            records.filter(pk__gt=last_pk).order_by('pk')
+            .values_list('pk', 'device_info')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        last_pk = batch[-1][0]
+        
+        pks_by_agent = {}
+        for pk, user_agent in batch:
+            if user_agent:
+                pks_by_agent.setdefault(user_agent, []).append(pk)
+        
+        with transaction.atomic(using=db):
+            for user_agent, pks in pks_by_agent.items():
+                if user_agent not in devices:
+                    device, created = Device.objects.using(db).get_or_create(
+                        ua_hash=hashlib.sha1(user_agent.encode()).hexdigest(),
+                        defaults={'user_agent': user_agent}
+                    )
+                    devices[user_agent] = device.pk
+                records.filter(pk__in=pks).update(device_id=devices[user_agent])
+
+
+def restore_device_info(apps, schema_editor):
+    Device = apps.get_model('attendance', 'Device')
+    AttendanceRecord = apps.get_model('attendance', 'AttendanceRecord')
+    db = schema_editor.connection.alias
+    
+    for device in Device.objects.using(db).iterator():
+        AttendanceRecord.objects.using(db).filter(device_id=device.pk).update(device_info=device.user_agent)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('attendance', '0002_device'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_device, restore_device_info),
+    ]
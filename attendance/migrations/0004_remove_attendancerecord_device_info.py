@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:11
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0003_populate_device'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='attendancerecord',
+            name='device_info',
+        ),
+    ]
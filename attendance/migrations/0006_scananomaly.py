@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0005_enrollment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScanAnomaly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('shared_ip', 'Many students from one IP'), ('shared_device', 'Many students from one device'), ('late_token', 'Token used at expiry')], max_length=20)),
+                ('key', models.CharField(blank=True, max_length=100)),
+                ('student_count', models.IntegerField(default=1)),
+                ('observed_at', models.DateTimeField()),
+                ('detected_at', models.DateTimeField(auto_now_add=True)),
+                ('record', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='anomalies', to='attendance.attendancerecord')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='anomalies', to='attendance.attendancesession')),
+            ],
+            options={
+                'ordering': ['-observed_at'],
+            },
+        ),
+    ]
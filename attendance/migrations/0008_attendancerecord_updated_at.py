@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0007_exportjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attendancerecord',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        # Existing rows were last written when they were scanned
+        migrations.RunSQL(
+            'UPDATE attendance_attendancerecord SET updated_at = timestamp',
+            migrations.RunSQL.noop,
+        ),
+    ]
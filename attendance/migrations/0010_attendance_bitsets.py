@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0009_attendanceedit'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('course_code', models.CharField(max_length=20, unique=True)),
+                ('session_ids', models.JSONField(default=list)),
+                ('session_starts', models.JSONField(default=list)),
+                ('stale', models.BooleanField(default=False)),
+                ('built_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AttendanceBitset',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('course_code', models.CharField(max_length=20)),
+                ('bits', models.BinaryField(default=bytes)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_bitsets', to='attendance.student')),
+            ],
+            options={
+                'unique_together': {('course_code', 'student')},
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fail_duplicate_active_jobs(apps, schema_editor):
+    # Keep the newest live job per fingerprint so the constraint can be added
+    ExportJob = apps.get_model('attendance', 'ExportJob')
+    seen = set()
+    for job in ExportJob.objects.filter(status__in=['pending', 'running']).order_by('-created_at', '-id'):
+        if job.fingerprint in seen:
+            ExportJob.objects.filter(pk=job.pk).update(status='failed', error='Superseded by an identical export')
+        seen.add(job.fingerprint)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0011_versionstamp'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(fail_duplicate_active_jobs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='exportjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['pending', 'running'])), fields=('fingerprint',), name='unique_active_export_fingerprint'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:03
+
+from django.db import migrations, models
+
+
+def mark_bulk_marked_records(apps, schema_editor):
+    # A record with a 'mark' edit for its student and session made no later than
+    # the record was created by that edit (marks skip students already present)
+    AttendanceRecord = apps.get_model('attendance', 'AttendanceRecord')
+    AttendanceEdit = apps.get_model('attendance', 'AttendanceEdit')
+    AttendanceRecord.objects.filter(models.Exists(AttendanceEdit.objects.filter(
+        action='mark', session=models.OuterRef('session'), student=models.OuterRef('student'),
+        created_at__gte=models.OuterRef('timestamp'),
+    ))).update(source='manual')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0012_export_fingerprint_constraint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attendanceedit',
+            name='record_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='attendancerecord',
+            name='source',
+            field=models.CharField(choices=[('scan', 'Scanned'), ('manual', 'Marked manually')], default='scan', max_length=10),
+        ),
+        migrations.RunPython(mark_bulk_marked_records, migrations.RunPython.noop),
+    ]
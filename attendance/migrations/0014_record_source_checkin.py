@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:19
+
+from django.db import migrations, models
+from django.db.models.functions import Now
+
+
+def mark_checkins(apps, schema_editor):
+    # Scanned records always point at the student's QR code (it only goes away
+    # with the student, records included); check-ins never do
+    AttendanceRecord = apps.get_model('attendance', 'AttendanceRecord')
+    ScanAnomaly = apps.get_model('attendance', 'ScanAnomaly')
+    checkins = AttendanceRecord.objects.filter(source='scan', qr_code__isnull=True)
+    # Shared IP/device flags raised by check-ins were phones behind one NAT or browser build
+    ScanAnomaly.objects.filter(record__in=checkins).delete()
+    checkins.update(source='checkin', updated_at=Now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0013_record_source'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='attendancerecord',
+            name='source',
+            field=models.CharField(choices=[('scan', 'Scanned'), ('checkin', 'Checked in'), ('manual', 'Marked manually')], default='scan', max_length=10),
+        ),
+        migrations.RunPython(mark_checkins, migrations.RunPython.noop),
+    ]
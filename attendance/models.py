@@ -1,16 +1,50 @@
 # attendance/models.py
-from django.db import models
+from django.db import models, router, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
 import uuid
-import qrcode
-from io import BytesIO
 from django.core.files import File
 from PIL import Image, ImageDraw
 import hashlib
-import time as t
+from django.db.models.functions import Coalesce
 from django.utils.timezone import now       
 
+from .qr_payload import new_token, encode_payload
+
+class StudentQuerySet(models.QuerySet):
+    def with_enrollment(self, course_code):
+        # Both flags come back with the student row, so scanners can enforce
+        # the roster without extra queries. Courses with no roster stay open.
+        return self.annotate(
+            is_enrolled=models.Exists(Enrollment.objects.filter(
+                course_code=course_code, student=models.OuterRef('pk')
+            )),
+            course_has_roster=models.Exists(Enrollment.objects.filter(course_code=course_code)),
+        )
+    
+    def absent_from(self, session):
+        # Enrolled students with no record for the session (NOT EXISTS anti-join
+        # on the student/session unique index)
+        return self.filter(enrollments__course_code=session.course_code).exclude(
+            models.Exists(AttendanceRecord.objects.filter(session=session, student=models.OuterRef('pk')))
+        )
+    
+    def with_missed_sessions(self, course_code, sessions_queryset=None):
+        # Annotates how many held sessions of the course each enrolled student missed,
+        # counting only sessions in `sessions_queryset` when one is given
+        sessions_queryset = sessions_queryset if sessions_queryset is not None else AttendanceSession.objects.all()
+        missed = sessions_queryset.filter(
+            course_code=course_code,
+            start_time__lte=timezone.now()
+        ).exclude(
+            models.Exists(AttendanceRecord.objects.filter(
+                session=models.OuterRef('pk'), student=models.OuterRef(models.OuterRef('pk'))
+            ))
+        ).values('course_code').annotate(count=models.Count('pk')).values('count')
+        return self.filter(enrollments__course_code=course_code).annotate(
+            missed_sessions=Coalesce(models.Subquery(missed), 0)
+        )
+
 class Student(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='student_profile')
     student_id = models.CharField(max_length=20, unique=True)
@@ -19,40 +53,27 @@ class Student(models.Model):
     phone = models.CharField(max_length=15, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    objects = StudentQuerySet.as_manager()
+    
     def __str__(self):
         return f"{self.student_id} - {self.user.get_full_name()}"
     
     def generate_qr_code(self):
-        # Generate unique token
-        token = hashlib.sha256(f"{self.student_id}{t.time()}".encode()).hexdigest()[:10]
+        # Generate unique token and the compact payload (see qr_payload.py)
+        token = new_token()
+        data = encode_payload(self.student_id, token)
         
-        # Create QR code
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
+        # The image is drawn where it is shown (dashboard template / scanner page),
+        # so only the payload is stored here
+        qr_code_obj, created = QRCode.objects.update_or_create(
+            student=self,
+            defaults={
+                'code': data,
+                'token': token,
+                'expires_at': timezone.now() + timezone.timedelta(seconds=30),
+                'is_used': False,
+            }
         )
-        data = f"ATT:{self.student_id}:{token}"
-        qr.add_data(data)
-        qr.make(fit=True)
-        
-        # Create image
-        img = qr.make_image(fill_color="black", back_color="white")
-        
-        # Save to BytesIO
-        buffer = BytesIO()
-        img.save(buffer, format='PNG')
-        
-        # Save to file
-        filename = f'qr_{self.student_id}_{token}.png'
-        
-        # Create or update QR code record
-        qr_code_obj, created = QRCode.objects.get_or_create(student=self)
-        qr_code_obj.code = data
-        qr_code_obj.token = token
-        qr_code_obj.expires_at = timezone.now() + timezone.timedelta(seconds=30)
-        qr_code_obj.save()
         
         return qr_code_obj
     
@@ -110,19 +131,219 @@ class AttendanceSession(models.Model):
         now = timezone.now()
         return self.is_active and self.start_time <= now <= self.end_time
 
+class DeviceManager(models.Manager):
+    # In-process intern cache: user agent string -> Device pk. There are only
+    # a few dozen distinct scanner browsers, so this stays tiny; the cap only
+    # guards against junk user agents filling it up.
+    INTERN_CACHE_SIZE = 1024
+    _intern_cache = {}
+    
+    def intern(self, user_agent):
+        """Return the pk of the Device row for this user agent, creating it if needed"""
+        if not user_agent:
+            return None
+        
+        device_id = self._intern_cache.get(user_agent)
+        if device_id is None:
+            device, created = self.get_or_create(
+                ua_hash=Device.hash_user_agent(user_agent),
+                defaults={'user_agent': user_agent}
+            )
+            device_id = device.pk
+            if len(self._intern_cache) < self.INTERN_CACHE_SIZE:
+                # Only once the row is committed: callers intern inside their own
+                # atomic block, and a rollback would leave a pk pointing nowhere
+                transaction.on_commit(
+                    lambda: self._intern_cache.setdefault(user_agent, device_id),
+                    using=router.db_for_write(self.model),
+                )
+        return device_id
+
+class Device(models.Model):
+    ua_hash = models.CharField(max_length=40, unique=True)
+    user_agent = models.TextField()
+    first_seen = models.DateTimeField(auto_now_add=True)
+    
+    objects = DeviceManager()
+    
+    @staticmethod
+    def hash_user_agent(user_agent):
+        return hashlib.sha1(user_agent.encode()).hexdigest()
+    
+    def __str__(self):
+        return self.user_agent[:80]
+
 class AttendanceRecord(models.Model):
+    SOURCES = [
+        ('scan', 'Scanned'),
+        ('checkin', 'Checked in'),  # reverse mode, from the student's own phone
+        ('manual', 'Marked manually'),
+    ]
+    
     student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='attendance_records')
     session = models.ForeignKey(AttendanceSession, on_delete=models.CASCADE, related_name='records')
     qr_code = models.ForeignKey(QRCode, on_delete=models.SET_NULL, null=True, blank=True)
     timestamp = models.DateTimeField(auto_now_add=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
-    device_info = models.TextField(blank=True)
+    device = models.ForeignKey(Device, on_delete=models.SET_NULL, null=True, blank=True, related_name='records')
+    # Indexed for incremental warehouse exports; queryset.update() must set it explicitly
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # Manual marks aren't arrivals, so arrival stats skip them. Anomaly checks
+    # only look at scans: check-ins share browser builds and campus NAT addresses
+    source = models.CharField(max_length=10, choices=SOURCES, default='scan')
     
     class Meta:
         unique_together = ['student', 'session']  # Prevent duplicate attendance
     
     def __str__(self):
         return f"{self.student.student_id} - {self.session.name}"
+    
+    @property
+    def device_info(self):
+        # Kept for templates and exports; select_related('device') to avoid a query per row
+        return self.device.user_agent if self.device_id else ''
+
+class ScanAnomaly(models.Model):
+    KINDS = [
+        ('shared_ip', 'Many students from one IP'),
+        ('shared_device', 'Many students from one device'),
+        ('late_token', 'Token used at expiry'),
+    ]
+    
+    session = models.ForeignKey(AttendanceSession, on_delete=models.CASCADE, related_name='anomalies')
+    record = models.ForeignKey(AttendanceRecord, on_delete=models.SET_NULL, null=True, blank=True, related_name='anomalies')
+    kind = models.CharField(max_length=20, choices=KINDS)
+    key = models.CharField(max_length=100, blank=True)  # IP address or device id
+    student_count = models.IntegerField(default=1)
+    observed_at = models.DateTimeField()  # timestamp of the triggering record
+    detected_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-observed_at']
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} in {self.session} ({self.key})"
+
+class AttendanceEdit(models.Model):
+    """Audit trail of manual (bulk) attendance corrections"""
+    ACTIONS = [
+        ('mark', 'Marked present'),
+        ('unmark', 'Marked absent'),
+    ]
+    
+    batch = models.UUIDField(db_index=True)  # one request's edits share a batch
+    session = models.ForeignKey(AttendanceSession, on_delete=models.CASCADE, related_name='edits')
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='attendance_edits')
+    action = models.CharField(max_length=10, choices=ACTIONS)
+    edited_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='attendance_edits')
+    reason = models.CharField(max_length=200, blank=True)
+    # Id of the record an unmark deleted, for the warehouse feed's tombstones.
+    # Not a foreign key: the record is gone.
+    record_id = models.BigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.get_action_display()}: {self.student.student_id} in {self.session}"
+
+class ExportJob(models.Model):
+    FORMATS = [
+        ('csv', 'CSV'),
+        ('excel', 'Excel'),
+    ]
+    STATUSES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    requested_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='export_jobs')
+    fingerprint = models.CharField(max_length=64, db_index=True)  # identical requests share a job
+    export_format = models.CharField(max_length=10, choices=FORMATS, default='csv')
+    params = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUSES, default='pending')
+    progress = models.IntegerField(default=0)
+    total = models.IntegerField(default=0)
+    file_path = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        constraints = [
+            # One live job per fingerprint, across every worker process
+            models.UniqueConstraint(
+                fields=['fingerprint'], condition=models.Q(status__in=['pending', 'running']),
+                name='unique_active_export_fingerprint',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"Export {self.id} ({self.get_status_display()})"
+    
+    def is_finished(self):
+        return self.status in ('done', 'failed')
+
+class EnrollmentManager(models.Manager):
+    def enroll(self, course_code, students):
+        """Bulk enroll students; already enrolled ones are left alone"""
+        return self.bulk_create(
+            [Enrollment(course_code=course_code, student=student) for student in students],
+            ignore_conflicts=True
+        )
+    
+    def unenroll(self, course_code, students):
+        deleted, _ = self.filter(course_code=course_code, student__in=students).delete()
+        return deleted
+
+class Enrollment(models.Model):
+    course_code = models.CharField(max_length=20)
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='enrollments')
+    enrolled_at = models.DateTimeField(auto_now_add=True)
+    
+    objects = EnrollmentManager()
+    
+    class Meta:
+        unique_together = ['course_code', 'student']
+    
+    def __str__(self):
+        return f"{self.course_code} - {self.student.student_id}"
+
+class CourseIndex(models.Model):
+    """Session order of a course's attendance bitsets: bit i is session_ids[i]"""
+    course_code = models.CharField(max_length=20, unique=True)
+    session_ids = models.JSONField(default=list)
+    session_starts = models.JSONField(default=list)  # unix times, same order
+    stale = models.BooleanField(default=False)  # sessions changed; rebuild before reading
+    built_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.course_code} ({len(self.session_ids)} sessions)"
+
+class AttendanceBitset(models.Model):
+    """One student's attendance in one course, a bit per session (little-endian bit order)"""
+    course_code = models.CharField(max_length=20)
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='attendance_bitsets')
+    bits = models.BinaryField(default=bytes)
+    
+    class Meta:
+        unique_together = ['course_code', 'student']
+    
+    def __str__(self):
+        return f"{self.student_id} in {self.course_code}"
+
+class VersionStamp(models.Model):
+    """Shared version counter behind the per-process caches (see versions.py)"""
+    key = models.CharField(max_length=100, unique=True)
+    version = models.BigIntegerField()
+    
+    def __str__(self):
+        return f"{self.key} = {self.version}"
 
 class AdminProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='admin_profile')
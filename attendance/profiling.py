@@ -0,0 +1,190 @@
+# attendance/profiling.py
+# Opt-in request profiling for admins. With ATTENDANCE_PROFILER['ENABLED'] set,
+# an admin request carrying `X-Profile: 1` (or `?_profile=1`) runs its view under
+# cProfile; `mem` instead of `1` also records top allocation sites with
+# tracemalloc. Captures go to a capped directory, oldest removed first.
+import cProfile
+import io
+import pstats
+import random
+import re
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+from django.conf import settings
+from django.http import FileResponse
+
+DEFAULTS = {
+    'ENABLED': False,
+    'DIR': None,
+    'MAX_CAPTURES': 50,
+    'SAMPLE_RATE': 1.0,     # fraction of flagged requests that actually get profiled
+    'MIN_INTERVAL': 10,     # seconds between captures in one process
+    'TRACEMALLOC': True,    # allow `mem` captures
+    'TOP_N': 30,
+}
+
+_capture_lock = threading.Lock()
+_last_capture = 0.0
+
+def profiler_settings():
+    conf = {**DEFAULTS, **getattr(settings, 'ATTENDANCE_PROFILER', {})}
+    conf['DIR'] = Path(conf['DIR'] or Path(settings.BASE_DIR) / 'profiles')
+    return conf
+
+def requested_mode(request):
+    flag = request.headers.get('X-Profile') or request.GET.get('_profile')
+    if flag in ('1', 'cpu'):
+        return 'cpu'
+    if flag == 'mem':
+        return 'mem'
+    return None
+
+def list_captures():
+    """Captures in the profile directory, newest first"""
+    directory = profiler_settings()['DIR']
+    if not directory.is_dir():
+        return []
+    captures = []
+    for path in directory.glob('*.prof'):
+        stat = path.stat()
+        summary = path.with_suffix('.txt')
+        captures.append({
+            'name': path.stem,
+            'size': stat.st_size,
+            'created': stat.st_mtime,
+            'headline': summary.read_text().splitlines()[0] if summary.exists() else '',
+        })
+    return sorted(captures, key=lambda capture: capture['created'], reverse=True)
+
+def capture_path(name, suffix):
+    """Path of a capture file, or None if the name isn't one of ours"""
+    if not re.fullmatch(r'[\w.-]+', name):
+        return None
+    path = profiler_settings()['DIR'] / f'{name}{suffix}'
+    return path if path.exists() else None
+
+def _rotate(directory, keep):
+    captures = sorted(directory.glob('*.prof'), key=lambda path: path.stat().st_mtime)
+    for path in captures[:max(0, len(captures) - keep)]:
+        path.unlink(missing_ok=True)
+        path.with_suffix('.txt').unlink(missing_ok=True)
+
+def _write_capture(conf, request, view_func, profiler, elapsed, status, snapshot):
+    directory = conf['DIR']
+    directory.mkdir(parents=True, exist_ok=True)
+    view_name = re.sub(r'[^\w]', '_', getattr(view_func, '__name__', 'view'))
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{int(time.time() * 1000) % 1000:03d}-{view_name}"
+
+    profiler.dump_stats(directory / f'{name}.prof')
+
+    summary = io.StringIO()
+    summary.write(f'{request.method} {request.get_full_path()} -> {status} in {elapsed * 1000:.1f} ms\n\n')
+    pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(conf['TOP_N'])
+    if snapshot is not None:
+        summary.write('\nTop allocation sites:\n')
+        for stat in snapshot.statistics('lineno')[:conf['TOP_N']]:
+            summary.write(f'{stat}\n')
+    (directory / f'{name}.txt').write_text(summary.getvalue())
+
+    _rotate(directory, conf['MAX_CAPTURES'])
+
+class _Capture:
+    """One profiled request. Holds _capture_lock until finish() writes the capture."""
+
+    def __init__(self, conf, request, view_func, mode):
+        self.conf, self.request, self.view_func = conf, request, view_func
+        self.finished = False
+        self.trace_memory = mode == 'mem' and conf['TRACEMALLOC'] and not tracemalloc.is_tracing()
+        if self.trace_memory:
+            tracemalloc.start()
+        self.profiler = cProfile.Profile()
+        self.started = time.perf_counter()
+
+    def run(self, func, *args, **kwargs):
+        self.profiler.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.profiler.disable()
+
+    def finish(self, status):
+        if self.finished:
+            return
+        self.finished = True
+        try:
+            elapsed = time.perf_counter() - self.started
+            snapshot = tracemalloc.take_snapshot() if self.trace_memory else None
+            if self.trace_memory:
+                tracemalloc.stop()
+            _write_capture(self.conf, self.request, self.view_func, self.profiler, elapsed, status, snapshot)
+        finally:
+            _capture_lock.release()
+
+class _ProfiledStream:
+    """Streaming content that stays profiled while the server reads it. Streamed
+    exports do their queries here rather than in the view, so the capture is
+    written once the content is exhausted (or the response closed)."""
+
+    def __init__(self, capture, content, status):
+        self.capture, self.content, self.status = capture, iter(content), status
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return self.capture.run(next, self.content)
+        except BaseException:
+            # StopIteration included
+            self.close()
+            raise
+
+    def close(self):
+        self.capture.finish(self.status)
+
+class ProfilerMiddleware:
+    """Keep last in MIDDLEWARE: it calls the view itself when profiling"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        global _last_capture
+        conf = profiler_settings()
+        mode = requested_mode(request)
+        if not conf['ENABLED'] or mode is None:
+            return None
+        if not hasattr(request.user, 'admin_profile'):
+            return None
+        if random.random() >= conf['SAMPLE_RATE']:
+            return None
+        if time.monotonic() - _last_capture < conf['MIN_INTERVAL']:
+            return None
+        # One capture at a time per process; everyone else runs unprofiled
+        if not _capture_lock.acquire(blocking=False):
+            return None
+
+        _last_capture = time.monotonic()
+        try:
+            capture = _Capture(conf, request, view_func, mode)
+        except BaseException:
+            _capture_lock.release()
+            raise
+        try:
+            response = capture.run(view_func, request, *view_args, **view_kwargs)
+        except BaseException:
+            capture.finish(500)
+            raise
+
+        # File downloads only read the file while streaming; those are done
+        if response.streaming and not response.is_async and not isinstance(response, FileResponse):
+            response.streaming_content = _ProfiledStream(capture, response.streaming_content, response.status_code)
+        else:
+            capture.finish(response.status_code)
+        return response
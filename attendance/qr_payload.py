@@ -0,0 +1,43 @@
+# attendance/qr_payload.py
+# Student QR payload formats.
+#   v1  ATT:<student_id>:<10 hex>      byte mode, usually QR version 2
+#   v2  A2:<STUDENT_ID>:<10 base32>    alphanumeric mode, fits QR version 1 (21x21)
+# v2 only uses characters from the QR alphanumeric set (0-9, A-Z, space and
+# $%*+-./:), which packs 5.5 bits per character instead of 8. Both formats parse,
+# so codes issued before the switch keep working.
+import base64
+import secrets
+
+from django.conf import settings
+
+V1_PREFIX = 'ATT:'
+V2_PREFIX = 'A2:'
+TOKEN_LENGTH = 10
+
+QR_ALPHANUMERIC = set('0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ $%*+-./:')
+
+def payload_version():
+    return getattr(settings, 'ATTENDANCE_QR_PAYLOAD_VERSION', 2)
+
+def new_token():
+    # 50 random bits as 10 base32 characters (A-Z, 2-7), all QR alphanumeric
+    return base64.b32encode(secrets.token_bytes(7)).decode()[:TOKEN_LENGTH]
+
+def encode_payload(student_id, token, version=None):
+    version = version or payload_version()
+    # IDs outside the alphanumeric set (lowercase, '_', ...) fall back to v1
+    if version >= 2 and ':' not in student_id and set(student_id) <= QR_ALPHANUMERIC:
+        return f'{V2_PREFIX}{student_id}:{token}'
+    return f'{V1_PREFIX}{student_id}:{token}'
+
+def is_attendance_payload(data):
+    return bool(data) and data.startswith((V1_PREFIX, V2_PREFIX))
+
+def parse_qr_payload(data):
+    """(student_id, token) for any known payload version, otherwise None"""
+    if not is_attendance_payload(data):
+        return None
+    parts = data.split(':')
+    if len(parts) < 3 or not parts[1] or not parts[2]:
+        return None
+    return parts[1], parts[2]
@@ -0,0 +1,82 @@
+# attendance/replica.py
+# Read replica for reporting views. Locally the "replica" is a snapshot of the
+# primary SQLite file taken with sqlite3's online backup API and swapped in
+# atomically, so long exports never hold read transactions on the file the
+# scanners write to.
+import os
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+
+REPLICA_ALIAS = 'replica'
+
+_refresh_lock = threading.Lock()
+
+def replica_configured():
+    return REPLICA_ALIAS in settings.DATABASES
+
+def replica_path():
+    return str(settings.DATABASES[REPLICA_ALIAS]['NAME'])
+
+def max_lag():
+    return getattr(settings, 'ATTENDANCE_REPLICA_MAX_LAG', 60)
+
+def snapshot_time():
+    """When the current snapshot was taken (its mtime), or None if there is none"""
+    if not replica_configured():
+        return None
+    try:
+        return os.stat(replica_path()).st_mtime
+    except OSError:
+        return None
+
+def refresh_replica():
+    """Copy the primary database into the replica file. Returns the seconds taken."""
+    started = time.monotonic()
+    target = replica_path()
+    tmp_path = f'{target}.{os.getpid()}.{threading.get_ident()}.tmp'
+
+    source = sqlite3.connect(str(settings.DATABASES['default']['NAME']))
+    try:
+        dest = sqlite3.connect(tmp_path)
+        try:
+            # Copy in chunks so writers are only blocked for short stretches
+            source.backup(dest, pages=1024)
+        finally:
+            dest.close()
+    finally:
+        source.close()
+
+    os.replace(tmp_path, target)
+    return time.monotonic() - started
+
+def refresh_replica_async():
+    """Start a background refresh unless one is already running in this process"""
+    if not _refresh_lock.acquire(blocking=False):
+        return False
+
+    def run():
+        try:
+            refresh_replica()
+        finally:
+            _refresh_lock.release()
+
+    threading.Thread(target=run, name='replica-refresh', daemon=True).start()
+    return True
+
+def replica_usable(last_write=None):
+    """True if the snapshot is within the staleness bound and newer than the
+    caller's own last write. Kicks off a refresh when it is too old."""
+    taken = snapshot_time()
+    if taken is None:
+        if replica_configured():
+            refresh_replica_async()
+        return False
+
+    if time.time() - taken > max_lag():
+        refresh_replica_async()
+        return False
+
+    return last_write is None or taken >= last_write
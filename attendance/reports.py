@@ -0,0 +1,91 @@
+# attendance/reports.py
+# Course-level reports built from a handful of aggregate queries and
+# vectorized NumPy/pandas operations instead of per-student loops.
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import AttendanceRecord, AttendanceSession, Student
+
+def absence_runs(absent):
+    """Length of the absence streak ending at each column, for a students x sessions bool matrix"""
+    counts = np.cumsum(absent, axis=1)
+    # Running count at the latest present (or future) column, carried forward
+    resets = np.maximum.accumulate(np.where(absent, 0, counts), axis=1)
+    return counts - resets
+
+class CourseMatrix:
+    """Students x sessions attendance for one course.
+
+    present[i, j] is True when student i has a record for session j. Sessions
+    are in chronological order; `held` marks those that have started."""
+
+    def __init__(self, course_code, sessions, students, present):
+        self.course_code = course_code
+        self.sessions = sessions
+        self.students = students
+        self.present = present
+        self.held = np.array([session['start_time'] <= timezone.now() for session in sessions], dtype=bool)
+
+        held_count = int(self.held.sum())
+        absent = ~present & self.held
+        runs = absence_runs(absent)
+        self.held_count = held_count
+        self.attended = (present & self.held).sum(axis=1)
+        self.percentage = np.round(100 * self.attended / held_count, 1) if held_count else np.zeros(len(students))
+        self.longest_absence = runs.max(axis=1) if len(sessions) else np.zeros(len(students), dtype=int)
+        last_held = np.flatnonzero(self.held)
+        self.current_absence = runs[:, last_held[-1]] if len(last_held) else np.zeros(len(students), dtype=int)
+
+    @classmethod
+    def build(cls, course_code, sessions_queryset=None):
+        sessions_queryset = sessions_queryset if sessions_queryset is not None else AttendanceSession.objects.all()
+        sessions = list(
+            sessions_queryset.filter(course_code=course_code).order_by('start_time', 'id').values('id', 'name', 'start_time')
+        )
+        session_ids = [session['id'] for session in sessions]
+
+        # Every (student, session) pair of the course in one query, straight into an array
+        pairs = AttendanceRecord.objects.filter(session_id__in=session_ids).values_list('student_id', 'session_id')
+        pairs = np.fromiter(chain.from_iterable(pairs.iterator(chunk_size=10000)), dtype=np.int64).reshape(-1, 2)
+
+        # Roster plus anyone who turned up without being enrolled
+        students = list(
+            Student.objects.filter(
+                Q(enrollments__course_code=course_code) | Q(id__in=np.unique(pairs[:, 0]).tolist())
+            ).distinct().order_by('student_id').values(
+                'id', 'student_id', 'user__first_name', 'user__last_name', 'department'
+            )
+        )
+
+        rows = pd.Index([student['id'] for student in students]).get_indexer(pairs[:, 0])
+        columns = pd.Index(session_ids).get_indexer(pairs[:, 1])
+        present = np.zeros((len(students), len(sessions)), dtype=bool)
+        present[rows, columns] = True
+        return cls(course_code, sessions, students, present)
+
+    def header(self):
+        return (
+            ['Student ID', 'Name', 'Department']
+            + [f"{session['start_time']:%Y-%m-%d} {session['name']}" for session in self.sessions]
+            + ['Attended', 'Held', 'Percentage', 'Longest Absence Streak', 'Current Absence Streak']
+        )
+
+    def rows(self, chunk_size=500):
+        """Report rows, converting the matrix chunk by chunk"""
+        for start in range(0, len(self.students), chunk_size):
+            stop = start + chunk_size
+            marks = np.where(self.present[start:stop], 'P', np.where(self.held, 'A', ''))
+            for offset, student in enumerate(self.students[start:stop]):
+                i = start + offset
+                yield (
+                    [student['student_id'],
+                     f"{student['user__first_name']} {student['user__last_name']}".strip(),
+                     student['department']]
+                    + marks[offset].tolist()
+                    + [int(self.attended[i]), self.held_count, float(self.percentage[i]),
+                       int(self.longest_absence[i]), int(self.current_absence[i])]
+                )
@@ -0,0 +1,27 @@
+# attendance/routers.py
+from contextvars import ContextVar
+
+from .replica import REPLICA_ALIAS
+
+# Set by the reads_from_replica decorator for the duration of a reporting view
+use_replica = ContextVar('use_replica', default=False)
+
+class ReplicaRouter:
+    """Sends attendance reads to the replica while a reporting view has opted in.
+    Everything else, and every write, stays on the primary."""
+
+    def db_for_read(self, model, **hints):
+        if use_replica.get() and model._meta.app_label == 'attendance':
+            return REPLICA_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Explicit, so objects loaded from the replica still save to the primary
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return {obj1._state.db, obj2._state.db} <= {'default', REPLICA_ALIAS}
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is a copy of the primary, it is never migrated directly
+        return db != REPLICA_ALIAS
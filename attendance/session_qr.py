@@ -0,0 +1,50 @@
+# attendance/session_qr.py
+# Rotating session codes for "reverse mode": the lecturer projects the code and
+# students scan it with their own phones.
+#   S1:<session id>:<window>:<signature>
+# The window is the current ROTATE_SECONDS slot and the signature an HMAC of
+# session and window, so codes can't be made up or reused once they rotate out.
+# Everything is alphanumeric-mode QR data, like the v2 student payloads.
+import base64
+import time
+
+from django.conf import settings
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+PREFIX = 'S1:'
+SIGNATURE_LENGTH = 16  # base32 characters, 80 bits
+
+def rotate_seconds():
+    return getattr(settings, 'ATTENDANCE_SESSION_QR_ROTATE', 15)
+
+def _window(now=None):
+    return int((now if now is not None else time.time()) // rotate_seconds())
+
+def _signature(session_id, window):
+    digest = salted_hmac('attendance.session_qr', f'{session_id}:{window}').digest()
+    return base64.b32encode(digest).decode()[:SIGNATURE_LENGTH]
+
+def session_payload(session_id, now=None):
+    """(QR data, seconds until it rotates) for a session"""
+    now = now if now is not None else time.time()
+    window = _window(now)
+    expires_in = (window + 1) * rotate_seconds() - now
+    return f'{PREFIX}{session_id}:{window}:{_signature(session_id, window)}', expires_in
+
+def is_session_payload(data):
+    return bool(data) and data.startswith(PREFIX)
+
+def verify_session_payload(data, now=None):
+    """Session id of a valid code from the current or previous window, otherwise None.
+    The previous window covers a phone that read the code just before it rotated."""
+    if not is_session_payload(data):
+        return None
+    parts = data.split(':')
+    if len(parts) != 4 or not parts[1].isdigit() or not parts[2].isdigit():
+        return None
+    session_id, window = int(parts[1]), int(parts[2])
+    if _window(now) - window not in (0, 1):
+        return None
+    if not constant_time_compare(parts[3], _signature(session_id, window)):
+        return None
+    return session_id
@@ -0,0 +1,77 @@
+# attendance/signals.py
+# Keeps the version stamps in versions.py moving with the data they describe
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import bitmaps, versions
+from .arrivals import forget_session_arrivals
+from .models import AttendanceRecord, AttendanceSession
+
+def session_records_version(session_id):
+    """Current version of a session's record list, or None if it was never versioned"""
+    return versions.peek(versions.records_key(session_id))
+
+def ensure_session_records_version(session_id):
+    return versions.get(versions.records_key(session_id))
+
+def session_owner(session_id):
+    """User id of a session's creator, or None if there's no such session.
+    Sessions never change owner, so the answer is cached in the process."""
+    key = f'attendance:session:{session_id}:owner'
+    owner = cache.get(key)
+    if owner is None:
+        owner = AttendanceSession.objects.using('default').filter(pk=session_id).values_list('created_by', flat=True).first()
+        if owner is not None:
+            cache.set(key, owner, timeout=None)
+    return owner
+
+# Set by batched_record_changes() while a bulk edit deletes records
+_batched = ContextVar('batched_record_changes', default=False)
+
+@contextmanager
+def batched_record_changes():
+    """Skip the per-record signal work below; the caller applies it once for
+    the whole batch (see corrections.apply_bulk_edit)"""
+    token = _batched.set(True)
+    try:
+        yield
+    finally:
+        _batched.reset(token)
+
+def bump_session_records(session_id):
+    """Call after changing a session's records outside of save()/delete(), e.g. bulk_create"""
+    versions.bump(versions.records_key(session_id))
+
+@receiver(post_save, sender=AttendanceRecord)
+@receiver(post_delete, sender=AttendanceRecord)
+def attendance_record_changed(sender, instance, **kwargs):
+    if _batched.get():
+        return
+    if not kwargs.get('created'):
+        # Arrival counts only follow new records
+        forget_session_arrivals(instance.session_id)
+    # The scan views already hold the session; only look it up when they don't
+    if AttendanceRecord._meta.get_field('session').is_cached(instance):
+        session = instance.session
+    else:
+        session = AttendanceSession.objects.filter(pk=instance.session_id).only('course_code', 'created_by').first()
+    keys = [versions.records_key(instance.session_id), versions.student_key(instance.student_id)]
+    if session is not None:
+        keys.append(versions.admin_dashboard_key(session.created_by_id))
+    # One UPDATE for all of them
+    versions.bump(*keys)
+    if session is not None and (kwargs.get('created') or kwargs['signal'] is post_delete):
+        bitmaps.mark(session, [instance.student_id], present=kwargs['signal'] is post_save)
+
+def bump_admin_dashboard(user_id):
+    versions.bump(versions.admin_dashboard_key(user_id))
+
+@receiver(post_save, sender=AttendanceSession)
+@receiver(post_delete, sender=AttendanceSession)
+def attendance_session_changed(sender, instance, **kwargs):
+    versions.bump(versions.SESSIONS_KEY, versions.admin_dashboard_key(instance.created_by_id))
+    bitmaps.session_changed(instance, created=kwargs.get('created', False), deleted=kwargs['signal'] is post_delete)
@@ -1,3 +1,1064 @@
-from django.test import TestCase
+import json
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+import zlib
+from io import StringIO
+from unittest import mock
+from datetime import datetime, timedelta, timezone as dt_timezone
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import bitmaps, exports, profiling, replica, session_qr, throttling, versions
+from .anomalies import ScanAnomalyDetector, anomaly_rules
+from .arrivals import (
+    BUCKET_SECONDS, course_arrival_peaks, queue_depth, rolling_minute, session_arrivals, session_bucket_counts, stations_needed,
+)
+from .corrections import apply_bulk_edit
+from .dashboards import active_sessions, admin_session_lists, student_history
+from .forms import split_student_ids
+from .middleware import LAST_WRITE_COOKIE
+from .qr_payload import QR_ALPHANUMERIC, encode_payload, new_token, parse_qr_payload
+from .models import (
+    AdminProfile, AttendanceBitset, AttendanceEdit, AttendanceRecord, AttendanceSession, Device, Enrollment, ExportJob,
+    QRCode, ScanAnomaly, Student,
+)
+from .reports import CourseMatrix, absence_runs
+from .routers import ReplicaRouter, use_replica
+from .throttling import take_token
+from .warehouse import decode_cursor, encode_cursor
+
+class DeviceInternTests(TestCase):
+    def setUp(self):
+        Device.objects._intern_cache.clear()
+        self.addCleanup(Device.objects._intern_cache.clear)
+
+    def test_cached_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            device_id = Device.objects.intern('Firefox')
+        self.assertEqual(Device.objects._intern_cache, {'Firefox': device_id})
+        with self.assertNumQueries(0):
+            self.assertEqual(Device.objects.intern('Firefox'), device_id)
+
+    def test_rolled_back_insert_is_not_cached(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    Device.objects.intern('Firefox')
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(Device.objects._intern_cache, {})
+        self.assertFalse(Device.objects.exists())
+
+    def test_failed_checkin_does_not_poison_the_browser(self):
+        now = timezone.now()
+        session = AttendanceSession.objects.create(
+            name='Lecture', course_code='CS101', created_by=User.objects.create_user('admin1'),
+            start_time=now - timedelta(minutes=5), end_time=now + timedelta(hours=1),
+        )
+        first = Student.objects.create(user=User.objects.create_user('s1'), student_id='S1', department='CS')
+        second = Student.objects.create(user=User.objects.create_user('s2'), student_id='S2', department='CS')
+        body = json.dumps({'qr_data': session_qr.session_payload(session.id)[0]})
+        
+        def checkin(student, user_agent):
+            self.client.force_login(student.user)
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    '/api/checkin/', body, content_type='application/json', HTTP_USER_AGENT=user_agent
+                )
+            return response.json()['success']
+        
+        self.assertTrue(checkin(first, 'Firefox'))
+        # A repeat from another browser rolls back, taking its new Device row with it
+        self.assertFalse(checkin(first, 'Safari'))
+        self.assertTrue(checkin(second, 'Safari'))
+        record = AttendanceRecord.objects.get(student=second)
+        self.assertEqual(record.device.user_agent, 'Safari')
+
+class TakeTokenTests(TestCase):
+    def test_full_bucket_then_wait(self):
+        state = None
+        for _ in range(3):
+            state, wait = take_token(state, 3, 1.0, now=100.0)
+            self.assertEqual(wait, 0)
+        state, wait = take_token(state, 3, 1.0, now=100.0)
+        self.assertAlmostEqual(wait, 1.0)
+
+    def test_refill_is_capped(self):
+        state, _ = take_token(None, 3, 1.0, now=0.0)
+        state, wait = take_token(state, 3, 1.0, now=1000.0)
+        self.assertEqual(wait, 0)
+        self.assertEqual(state, (2, 1000.0))
+
+@override_settings(ATTENDANCE_THROTTLE_RATES={'scan': '100/min', 'scan_session': '2/min'})
+class ScanThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        throttling._local_store.buckets.clear()
+        self.owner = User.objects.create_user('admin1')
+        self.other = User.objects.create_user('admin2')
+        for user in (self.owner, self.other):
+            AdminProfile.objects.create(user=user, department='CS')
+        now = timezone.now()
+        self.session = AttendanceSession.objects.create(
+            name='Lecture', course_code='CS101', created_by=self.owner,
+            start_time=now - timedelta(minutes=5), end_time=now + timedelta(hours=1),
+        )
+
+    def scan(self, user):
+        self.client.force_login(user)
+        return self.client.post(
+            f'/api/session/{self.session.id}/scan/', json.dumps({'qr_data': ''}), content_type='application/json'
+        ).status_code
+
+    def test_session_bucket(self):
+        self.assertEqual([self.scan(self.owner) for _ in range(3)], [200, 200, 429])
+
+    def test_other_admins_do_not_spend_the_session_bucket(self):
+        for _ in range(5):
+            self.assertNotEqual(self.scan(self.other), 429)
+        self.assertEqual([self.scan(self.owner) for _ in range(3)], [200, 200, 429])
+
+class RosterParsingTests(TestCase):
+    def test_lists(self):
+        self.assertEqual(split_student_ids('S1\nS2 S3\n\nS1'), ['S1', 'S2', 'S3'])
+        self.assertEqual(split_student_ids('PRC3, PRC4\nPRC0'), ['PRC3', 'PRC4', 'PRC0'])
+        self.assertEqual(split_student_ids('S1\tS2'), ['S1', 'S2'])
+        self.assertEqual(split_student_ids(' \n'), [])
+
+    def test_exported_csv_uses_the_student_id_column(self):
+        text = 'Name,Student ID,Department\n"Smith, Alice",S1,CS\nBob,S2,CS\n'
+        self.assertEqual(split_student_ids(text), ['S1', 'S2'])
+        self.assertEqual(split_student_ids('student_id\tname\nS1\tAlice'), ['S1'])
+
+    def test_headerless_csv_keeps_every_field(self):
+        # Extra columns come back as unknown IDs instead of vanishing
+        self.assertEqual(split_student_ids('S1,Alice\nS2,Bob'), ['S1', 'Alice', 'S2', 'Bob'])
+
+class EnrollmentTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user('admin1')
+        self.other = User.objects.create_user('admin2')
+        AdminProfile.objects.create(user=self.admin, department='CS')
+        now = timezone.now()
+        self.sessions = [
+            AttendanceSession.objects.create(
+                name=f'L{i}', course_code='CS101', created_by=self.admin if i < 2 else self.other,
+                start_time=now - timedelta(days=5 - i), end_time=now - timedelta(days=5 - i, hours=-1),
+            )
+            for i in range(4)
+        ]
+        self.students = [
+            Student.objects.create(user=User.objects.create_user(f's{i}'), student_id=f'S{i}', department='CS')
+            for i in range(3)
+        ]
+        Enrollment.objects.enroll('CS101', self.students[:2])
+        for session in self.sessions:
+            AttendanceRecord.objects.create(session=session, student=self.students[0])
+        AttendanceRecord.objects.create(session=self.sessions[0], student=self.students[1])
+
+    def test_absent_from_only_lists_enrolled_students(self):
+        absent = Student.objects.absent_from(self.sessions[1]).values_list('student_id', flat=True)
+        self.assertEqual(list(absent), ['S1'])
+
+    def test_missed_sessions_scoped_to_sessions(self):
+        missed = dict(Student.objects.with_missed_sessions('CS101').values_list('student_id', 'missed_sessions'))
+        self.assertEqual(missed, {'S0': 0, 'S1': 3})
+        mine = AttendanceSession.objects.filter(created_by=self.admin)
+        missed = dict(Student.objects.with_missed_sessions('CS101', mine).values_list('student_id', 'missed_sessions'))
+        self.assertEqual(missed, {'S0': 0, 'S1': 1})
+
+    @mock.patch('attendance.decorators.replica_usable', return_value=False)
+    def test_course_absentees_csv_counts_the_admins_sessions(self, replica_usable):
+        self.client.force_login(self.admin)
+        response = self.client.get('/admin/course/CS101/export/absentees/')
+        rows = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(rows[1:], ['S1,,CS,1,1'])
+
+class ReplicaRoutingTests(TestCase):
+    def test_router(self):
+        router = ReplicaRouter()
+        self.assertIsNone(router.db_for_read(AttendanceRecord))
+        token = use_replica.set(True)
+        try:
+            self.assertEqual(router.db_for_read(AttendanceRecord), 'replica')
+            self.assertIsNone(router.db_for_read(User))
+            self.assertEqual(router.db_for_write(AttendanceRecord), 'default')
+        finally:
+            use_replica.reset(token)
+        self.assertFalse(router.allow_migrate('replica', 'attendance'))
+
+    @mock.patch('attendance.replica.refresh_replica_async')
+    def test_replica_usable(self, refresh):
+        with tempfile.TemporaryDirectory() as tmp, mock.patch('attendance.replica.replica_path',
+                                                              return_value=os.path.join(tmp, 'replica.sqlite3')):
+            self.assertFalse(replica.replica_usable())
+            self.assertEqual(refresh.call_count, 1)
+            open(replica.replica_path(), 'w').close()
+            taken = replica.snapshot_time()
+            self.assertTrue(replica.replica_usable())
+            self.assertTrue(replica.replica_usable(last_write=taken - 1))
+            # Your own newer write sends you to the primary
+            self.assertFalse(replica.replica_usable(last_write=taken + 1))
+            os.utime(replica.replica_path(), (taken - 3600, taken - 3600))
+            self.assertFalse(replica.replica_usable())
+            self.assertEqual(refresh.call_count, 2)
+
+    def test_writes_set_the_last_write_cookie(self):
+        admin = User.objects.create_user('admin1')
+        AdminProfile.objects.create(user=admin, department='CS')
+        self.client.force_login(admin)
+        self.assertNotIn(LAST_WRITE_COOKIE, self.client.get('/api/throttle/stats/').cookies)
+        response = self.client.post('/api/session/0/scan/', '{}', content_type='application/json')
+        self.assertGreater(float(response.cookies[LAST_WRITE_COOKIE].value), time.time() - 60)
+
+class ReplicaRefreshTests(TransactionTestCase):
+    def test_snapshot_copies_the_primary(self):
+        admin = User.objects.create_user('admin1')
+        AttendanceSession.objects.create(
+            name='Lecture', course_code='CS101', created_by=admin,
+            start_time=timezone.now(), end_time=timezone.now() + timedelta(hours=1),
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'replica.sqlite3')
+            with mock.patch('attendance.replica.replica_path', return_value=path):
+                replica.refresh_replica()
+            copy = sqlite3.connect(path)
+            try:
+                names = copy.execute('SELECT name FROM attendance_attendancesession').fetchall()
+            finally:
+                copy.close()
+        self.assertEqual(names, [('Lecture',)])
+
+class SessionRecordsFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user('admin1')
+        self.other = User.objects.create_user('admin2')
+        for user in (self.owner, self.other):
+            AdminProfile.objects.create(user=user, department='CS')
+        now = timezone.now()
+        self.session = AttendanceSession.objects.create(
+            name='Lecture', course_code='CS101', created_by=self.owner,
+            start_time=now - timedelta(minutes=5), end_time=now + timedelta(hours=1),
+        )
+        self.students = [
+            Student.objects.create(user=User.objects.create_user(f's{i}'), student_id=f'S{i}', department='CS')
+            for i in range(2)
+        ]
+        self.first = AttendanceRecord.objects.create(session=self.session, student=self.students[0])
+        self.url = f'/api/session/{self.session.id}/records/'
+
+    def test_records_since_cursor(self):
+        self.client.force_login(self.owner)
+        data = self.client.get(self.url).json()
+        self.assertEqual(([row['student_id'] for row in data['records']], data['cursor'], data['count']), (['S0'], self.first.id, 1))
+        second = AttendanceRecord.objects.create(session=self.session, student=self.students[1])
+        data = self.client.get(self.url, {'since': data['cursor']}).json()
+        self.assertEqual(([row['student_id'] for row in data['records']], data['cursor'], data['count']), (['S1'], second.id, 2))
+        self.assertEqual(self.client.get(self.url, {'since': 'x'}).status_code, 400)
+
+    def test_not_modified_until_the_session_changes(self):
+        self.client.force_login(self.owner)
+        etag = self.client.get(self.url, {'since': self.first.id})['ETag']
+        # Login session, user and admin profile, then one stamp lookup
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url, {'since': self.first.id}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        AttendanceRecord.objects.create(session=self.session, student=self.students[1])
+        response = self.client.get(self.url, {'since': self.first.id}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, len(response.json()['records'])), (200, 1))
+        # The cursor is part of the tag
+        self.assertNotEqual(self.client.get(self.url)['ETag'], response['ETag'])
+
+    def test_only_the_owner_gets_a_304(self):
+        self.client.force_login(self.owner)
+        etag = self.client.get(self.url)['ETag']
+        self.client.force_login(self.other)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 404)
+
+class ProfilerTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        settings = override_settings(ATTENDANCE_PROFILER={'ENABLED': True, 'DIR': self.dir, 'MIN_INTERVAL': 0, 'MAX_CAPTURES': 2})
+        settings.enable()
+        self.addCleanup(settings.disable)
+        profiling._last_capture = 0.0
+        self.admin = User.objects.create_user('admin1')
+        AdminProfile.objects.create(user=self.admin, department='CS')
+        self.client.force_login(self.admin)
+
+    def captures(self):
+        return sorted(os.listdir(self.dir))
+
+    def test_capture_written_for_flagged_admin_requests(self):
+        self.client.get('/api/throttle/stats/')
+        self.assertEqual(self.captures(), [])
+        self.client.get('/api/throttle/stats/', HTTP_X_PROFILE='1')
+        [capture] = profiling.list_captures()
+        self.assertTrue(capture['name'].endswith('api_throttle_stats'))
+        self.assertEqual(capture['headline'].split(' -> ')[1].split()[0], '200')
+        self.assertIsNotNone(profiling.capture_path(capture['name'], '.txt'))
+        self.assertIsNone(profiling.capture_path('../secret', '.txt'))
+
+    def test_oldest_captures_rotated_out(self):
+        for _ in range(3):
+            self.client.get('/api/throttle/stats/', HTTP_X_PROFILE='1')
+        self.assertEqual(len(profiling.list_captures()), 2)
+
+    @mock.patch('attendance.decorators.replica_usable', return_value=False)
+    def test_streamed_response_profiled_until_consumed(self, replica_usable):
+        now = timezone.now()
+        session = AttendanceSession.objects.create(
+            name='Lecture', course_code='CS101', created_by=self.admin, start_time=now, end_time=now + timedelta(hours=1),
+        )
+        response = self.client.get(f'/admin/session/{session.id}/export/absentees/', HTTP_X_PROFILE='1')
+        self.assertEqual(self.captures(), [])
+        b''.join(response.streaming_content)
+        [capture] = profiling.list_captures()
+        # The rows are fetched while streaming, after the view has returned
+        summary = profiling.capture_path(capture['name'], '.txt').read_text()
+        self.assertIn('generate', summary)
+        self.assertFalse(profiling._capture_lock.locked())
+
+class AnomalyDetectorTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.session = AttendanceSession.objects.create(
+            name='Lecture', course_code='CS101', created_by=User.objects.create_user('admin1'),
+            start_time=now - timedelta(minutes=5), end_time=now + timedelta(hours=1),
+        )
+        self.students = [
+            Student.objects.create(user=User.objects.create_user(f's{i}'), student_id=f'S{i}', department='CS')
+            for i in range(6)
+        ]
+        self.start = now
+        self.detector = ScanAnomalyDetector({**anomaly_rules(), 'SHARED_IP_THRESHOLD': 3, 'SHARED_DEVICE_THRESHOLD': 3})
+
+    def record(self, student, seconds, ip='10.0.0.1', **fields):
+        return AttendanceRecord(
+            session=self.session, student=self.students[student], ip_address=ip,
+            timestamp=self.start + timedelta(seconds=seconds), **fields
+        )
+
+    def kinds(self, *scans):
+        return [[anomaly.kind for anomaly in self.detector.check(self.record(*scan))] for scan in scans]
+
+    def test_shared_ip_flagged_once_per_window(self):
+        self.assertEqual(self.kinds((0, 0), (0, 1), (1, 2), (2, 3), (3, 4)), [[], [], [], ['shared_ip'], []])
+        # A new burst once the window has passed
+        self.assertEqual(self.kinds((3, 20), (4, 21), (5, 22)), [[], [], ['shared_ip']])
+
+    def test_window_slides(self):
+        self.assertEqual(self.kinds((0, 0), (1, 11), (2, 22), (3, 33)), [[], [], [], []])
+        self.assertEqual(self.kinds((0, 0, '10.0.0.2'), (1, 1, '10.0.0.3'), (2, 2, '10.0.0.4')), [[], [], []])
+
+    def test_late_tokens_off_by_default(self):
+        qr_code = QRCode.objects.create(student=self.students[0], code='c', token='t', expires_at=self.start + timedelta(seconds=1))
+        record = self.record(0, 0, qr_code=qr_code)
+        self.assertEqual(self.detector.check(record), [])
+        detector = ScanAnomalyDetector({**anomaly_rules(), 'LATE_TOKEN_SECONDS': 2})
+        self.assertEqual([anomaly.kind for anomaly in detector.check(record)], ['late_token'])
+
+    def test_detect_anomalies_command(self):
+        for student in range(3):
+            record = AttendanceRecord.objects.create(session=self.session, student=self.students[student], ip_address='10.0.0.1')
+            AttendanceRecord.objects.filter(pk=record.pk).update(timestamp=self.start + timedelta(seconds=student))
+        with override_settings(ATTENDANCE_ANOMALY_RULES={'SHARED_IP_THRESHOLD': 3}):
+            call_command('detect_anomalies', '--replace', stdout=StringIO())
+            call_command('detect_anomalies', '--replace', stdout=StringIO())
+        anomaly = ScanAnomaly.objects.get()
+        self.assertEqual((anomaly.kind, anomaly.key, anomaly.student_count), ('shared_ip', '10.0.0.1', 3))
+
+@mock.patch('attendance.exports.get_executor')
+class ExportJobTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        settings = override_settings(MEDIA_ROOT=tmp.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.admin = User.objects.create_user('admin1')
+        AdminProfile.objects.create(user=self.admin, department='CS')
+        now = timezone.now()
+        self.session = AttendanceSession.objects.create(
+            name='Lecture', course_code='CS101', created_by=self.admin, start_time=now, end_time=now + timedelta(hours=1),
+        )
+        self.students = [
+            Student.objects.create(user=User.objects.create_user(f's{i}'), student_id=f'S{i}', department='CS')
+            for i in range(2)
+        ]
+        AttendanceRecord.objects.create(session=self.session, student=self.students[0])
+        self.params = exports.normalize_params({'course_codes': ['CS101']})
+
+    def run_job(self, job):
+        # The worker closes its thread's connection when done; here that is the test's
+        with mock.patch('attendance.exports.connection'):
+            exports.run_export_job(job.pk)
+        job.refresh_from_db()
+        return job
+
+    def test_identical_live_requests_share_a_job(self, get_executor):
+        job, created = exports.submit_export(self.admin, 'csv', self.params)
+        self.assertTrue(created)
+        self.assertEqual(exports.submit_export(self.admin, 'csv', self.params), (job, False))
+        self.assertTrue(exports.submit_export(self.admin, 'excel', self.params)[1])
+        self.assertEqual(get_executor.return_value.submit.call_count, 2)
+
+    def test_finished_exports_are_not_reused(self, get_executor):
+        job = self.run_job(exports.submit_export(self.admin, 'csv', self.params)[0])
+        self.assertEqual((job.status, job.total), ('done', 1))
+        AttendanceRecord.objects.create(session=self.session, student=self.students[1])
+        again, created = exports.submit_export(self.admin, 'csv', self.params)
+        self.assertTrue(created)
+        self.assertEqual(self.run_job(again).total, 2)
+
+        self.client.force_login(self.admin)
+        response = self.client.get(f'/admin/exports/{job.id}/download/')
+        self.assertEqual(len(b''.join(response.streaming_content).decode().splitlines()), 2)
+
+    def test_stale_jobs_are_replaced(self, get_executor):
+        job = exports.submit_export(self.admin, 'csv', self.params)[0]
+        ExportJob.objects.filter(pk=job.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+        again, created = exports.submit_export(self.admin, 'csv', self.params)
+        self.assertTrue(created)
+        # The abandoned job doesn't run if its worker gets to it after all
+        self.assertEqual(self.run_job(job).status, 'failed')
+        self.assertFalse(os.path.exists(exports.export_dir() / f'attendance_export_{job.pk}.csv'))
+
+    def test_params_validation(self, get_executor):
+        self.assertEqual(exports.normalize_params({'session_ids': ['2', 1, 2]})['session_ids'], [1, 2])
+        for data in [{}, {'start': '19-10-2026'}]:
+            with self.assertRaises(ValueError):
+                exports.normalize_params(data)
+
+# The command sets a connection PRAGMA that SQLite refuses inside a transaction
+class SeedScaleTests(TransactionTestCase):
+    def seed(self, **options):
+        call_command('seed_scale', students=60, admins=2, courses=4, weeks=2, stdout=StringIO(), **options)
+
+    def test_seeds_a_usable_term(self):
+        self.seed()
+        self.assertEqual(Student.objects.filter(student_id__startswith='SCL').count(), 60)
+        self.assertEqual(AttendanceSession.objects.count(), 4 * 2 * 2)
+        self.assertEqual(Enrollment.objects.count(), 60 * 4)
+        records = AttendanceRecord.objects.all()
+        self.assertGreater(records.count(), 0)
+        self.assertEqual(set(records.values_list('source', flat=True)), {'scan'})
+        # The reports read it like scanned data
+        session = AttendanceSession.objects.order_by('id').first()
+        self.assertEqual(sum(session_bucket_counts(session.id).values()), session.records.count())
+        self.assertTrue(bitmaps.at_risk([session.course_code], below=101, streak=0))
+
+    def test_refuses_to_seed_twice(self):
+        self.seed()
+        with self.assertRaises(CommandError):
+            self.seed()
+
+class QRPayloadTests(TestCase):
+    def test_v2_fits_a_version_1_symbol(self):
+        import qrcode
+
+        token = new_token()
+        self.assertTrue(set(token) <= QR_ALPHANUMERIC)
+        data = encode_payload('STU20260001', token)
+        self.assertEqual(data, f'A2:STU20260001:{token}')
+        # Level L, as the student dashboard renders it
+        qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_L)
+        qr.add_data(data)
+        qr.make(fit=True)
+        self.assertEqual(qr.version, 1)
+
+    def test_falls_back_to_v1(self):
+        self.assertEqual(encode_payload('stu_1', 'TOKEN'), 'ATT:stu_1:TOKEN')
+        self.assertEqual(encode_payload('STU1', 'TOKEN', version=1), 'ATT:STU1:TOKEN')
+
+    def test_parses_both_versions(self):
+        self.assertEqual(parse_qr_payload('A2:STU1:TOKEN'), ('STU1', 'TOKEN'))
+        self.assertEqual(parse_qr_payload('ATT:stu_1:0a1b2c3d4e'), ('stu_1', '0a1b2c3d4e'))
+        for data in ['', None, 'A2:STU1', 'A2::TOKEN', 'S1:1:2:SIG', 'hello']:
+            self.assertIsNone(parse_qr_payload(data))
+
+    def test_issued_code_is_accepted_by_the_scanner(self):
+        cache.clear()
+        throttling._local_store.buckets.clear()
+        admin = User.objects.create_user('admin1')
+        AdminProfile.objects.create(user=admin, department='CS')
+        student = Student.objects.create(user=User.objects.create_user('s1'), student_id='S1', department='CS')
+        now = timezone.now()
+        session = AttendanceSession.objects.create(
+            name='Lecture', course_code='CS101', created_by=admin,
+            start_time=now - timedelta(minutes=5), end_time=now + timedelta(hours=1),
+        )
+        self.client.force_login(student.user)
+        qr_data = self.client.get('/student/get-qr/').json()['qr_data']
+        self.assertTrue(qr_data.startswith('A2:S1:'))
+        self.client.force_login(admin)
+        url = f'/api/session/{session.id}/scan/'
+        body = json.dumps({'qr_data': qr_data})
+        self.assertTrue(self.client.post(url, body, content_type='application/json').json()['success'])
+        # Used up
+        self.assertFalse(self.client.post(url, body, content_type='application/json').json()['success'])
+
+class CourseMatrixTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user('admin1')
+        AdminProfile.objects.create(user=self.admin, department='CS')
+        now = timezone.now()
+        # Three held sessions and one still to come
+        self.sessions = [
+            AttendanceSession.objects.create(
+                name=f'L{i}', course_code='CS101', created_by=self.admin,
+                start_time=now + timedelta(days=i - 3, hours=12), end_time=now + timedelta(days=i - 3, hours=13),
+            )
+            for i in range(4)
+        ]
+        self.students = [
+            Student.objects.create(user=User.objects.create_user(f's{i}', first_name=f'N{i}'), student_id=f'S{i}', department='CS')
+            for i in range(3)
+        ]
+        Enrollment.objects.enroll('CS101', self.students[:2])
+        for i in (0, 1, 2):
+            AttendanceRecord.objects.create(session=self.sessions[i], student=self.students[0])
+        AttendanceRecord.objects.create(session=self.sessions[0], student=self.students[1])
+        # Came once without being enrolled
+        AttendanceRecord.objects.create(session=self.sessions[2], student=self.students[2])
+
+    def test_matrix(self):
+        with self.assertNumQueries(3):
+            matrix = CourseMatrix.build('CS101')
+        self.assertEqual([student['student_id'] for student in matrix.students], ['S0', 'S1', 'S2'])
+        self.assertEqual(matrix.held.tolist(), [True, True, True, False])
+        self.assertEqual(matrix.attended.tolist(), [3, 1, 1])
+        self.assertEqual(matrix.percentage.tolist(), [100.0, 33.3, 33.3])
+        self.assertEqual(matrix.longest_absence.tolist(), [0, 2, 2])
+        self.assertEqual(matrix.current_absence.tolist(), [0, 2, 0])
+        rows = list(matrix.rows(chunk_size=2))
+        self.assertEqual(rows[1], ['S1', 'N1', 'CS', 'P', 'A', 'A', '', 1, 3, 33.3, 2, 2])
+        self.assertEqual(len(matrix.header()), len(rows[0]))
+
+    @mock.patch('attendance.decorators.replica_usable', return_value=False)
+    def test_exports(self, replica_usable):
+        self.client.force_login(self.admin)
+        response = self.client.get('/admin/course/CS101/export/matrix/csv/')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[1].startswith('S0,N0,CS,P,P,P,,3,3,100.0'))
+        response = self.client.get('/admin/course/CS101/export/matrix/excel/')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'PK'))
+
+    @mock.patch('attendance.decorators.replica_usable', return_value=False)
+    def test_export_only_covers_the_admins_sessions(self, replica_usable):
+        other = User.objects.create_user('admin2')
+        AdminProfile.objects.create(user=other, department='CS')
+        self.client.force_login(other)
+        response = self.client.get('/admin/course/CS101/export/matrix/csv/')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        # Just the roster, with no sessions
+        self.assertEqual([line.split(',')[0] for line in lines[1:]], ['S0', 'S1'])
+        self.assertTrue(lines[1].endswith(',0,0,0.0,0,0'))
+
+class DashboardCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user('admin1')
+        now = timezone.now()
+        self.session = AttendanceSession.objects.create(
+            name='Lecture', course_code='CS101', created_by=self.admin,
+            start_time=now - timedelta(minutes=5), end_time=now + timedelta(minutes=2),
+        )
+        self.student = Student.objects.create(user=User.objects.create_user('s1'), student_id='S1', department='CS')
+
+    def test_active_sessions(self):
+        sessions, ttl, version = active_sessions()
+        self.assertEqual(sessions, [self.session])
+        # Expires when the session ends, not after the default 5 minutes
+        self.assertTrue(110 <= ttl <= 120)
+        with self.assertNumQueries(1):
+            self.assertEqual(active_sessions()[0], [self.session])
+
+        self.session.name = 'Renamed'
+        self.session.save()
+        sessions, _, new_version = active_sessions()
+        self.assertNotEqual(new_version, version)
+        self.assertEqual(sessions[0].name, 'Renamed')
+
+    def test_admin_lists_follow_scans(self):
+        lists = admin_session_lists(self.admin)
+        self.assertEqual([session.attendance_count for session in lists['active_sessions']], [0])
+        with self.assertNumQueries(1):
+            admin_session_lists(self.admin)
+        AttendanceRecord.objects.create(session=self.session, student=self.student)
+        lists = admin_session_lists(self.admin)
+        self.assertEqual([session.attendance_count for session in lists['today_sessions']], [1])
+
+    def test_student_history_follows_records_and_sessions(self):
+        self.assertEqual(student_history(self.student), [])
+        record = AttendanceRecord.objects.create(session=self.session, student=self.student)
+        self.assertEqual(student_history(self.student), [record])
+        with self.assertNumQueries(2):
+            student_history(self.student)
+        self.session.name = 'Renamed'
+        self.session.save()
+        self.assertEqual(student_history(self.student)[0].session.name, 'Renamed')
+        record.delete()
+        self.assertEqual(student_history(self.student), [])
+
+class SessionPayloadTests(TestCase):
+    def test_current_and_previous_window(self):
+        now = 1_000_000.0
+        data, expires_in = session_qr.session_payload(42, now=now)
+        self.assertTrue(0 < expires_in <= session_qr.rotate_seconds())
+        self.assertEqual(session_qr.verify_session_payload(data, now=now), 42)
+        self.assertEqual(session_qr.verify_session_payload(data, now=now + session_qr.rotate_seconds()), 42)
+        self.assertIsNone(session_qr.verify_session_payload(data, now=now + 2 * session_qr.rotate_seconds()))
+
+    def test_rejects_forged_codes(self):
+        data, _ = session_qr.session_payload(42, now=1_000_000.0)
+        prefix, session_id, window, signature = data.split(':')
+        forged = ':'.join([prefix, '43', window, signature])
+        self.assertIsNone(session_qr.verify_session_payload(forged, now=1_000_000.0))
+        tampered = data[:-1] + ('B' if data.endswith('A') else 'A')
+        self.assertIsNone(session_qr.verify_session_payload(tampered, now=1_000_000.0))
+        self.assertIsNone(session_qr.verify_session_payload('V2:STU1:token'))
+        self.assertIsNone(session_qr.verify_session_payload(''))
+
+class ArrivalTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user('admin1')
+        now = timezone.now()
+        self.session = AttendanceSession.objects.create(
+            name='Lecture', course_code='CS101', created_by=self.admin, location='Room 1',
+            start_time=now - timedelta(hours=1), end_time=now + timedelta(hours=1),
+        )
+        self.students = [
+            Student.objects.create(user=User.objects.create_user(f's{i}'), student_id=f'S{i}', department='CS')
+            for i in range(8)
+        ]
+        # On a bucket boundary
+        self.start = datetime.fromtimestamp(
+            (int(now.timestamp()) // BUCKET_SECONDS - 100) * BUCKET_SECONDS, tz=dt_timezone.utc
+        )
+
+    def scan(self, student, seconds, session=None, **fields):
+        record = AttendanceRecord.objects.create(session=session or self.session, student=student, **fields)
+        AttendanceRecord.objects.filter(pk=record.pk).update(timestamp=self.start + timedelta(seconds=seconds))
+        return record
+
+    def test_helpers(self):
+        keys = np.arange(10)
+        self.assertEqual(rolling_minute(keys, np.ones(10, dtype=np.int64)).tolist(), [1, 2, 3, 4, 5, 6, 6, 6, 6, 6])
+        # 5 s a scan: one station clears two scans a bucket
+        self.assertEqual(queue_depth(np.array([5, 5, 0, 0, 0]), 1).tolist(), [3, 6, 4, 2, 0])
+        self.assertEqual(queue_depth(np.array([5, 5, 0, 0, 0]), 3).tolist(), [0, 0, 0, 0, 0])
+        self.assertEqual((stations_needed(0), stations_needed(30)), (1, 3))
+
+    def test_session_arrivals(self):
+        for i in range(6):
+            self.scan(self.students[i], 2)
+        self.scan(self.students[6], 35)
+        self.scan(self.students[7], 3, source='manual')
+        arrivals = session_arrivals(self.session)
+        self.assertEqual(arrivals['total'], 7)
+        self.assertEqual([bucket['scans'] for bucket in arrivals['buckets']], [6, 0, 0, 1])
+        self.assertEqual(arrivals['buckets'][0]['start'], self.start.isoformat())
+        self.assertEqual((arrivals['peak_bucket'], arrivals['peak_per_minute'], arrivals['stations_needed']), (6, 7, 1))
+        self.assertEqual(arrivals['max_queue'], 4.0)
+        self.assertEqual(session_arrivals(self.session, stations=3)['max_queue'], 0.0)
+
+    def test_counts_refresh_incrementally(self):
+        self.scan(self.students[0], 2)
+        self.assertEqual(session_bucket_counts(self.session.id), {self.start.timestamp() // BUCKET_SECONDS: 1})
+        self.scan(self.students[1], 12)
+        with self.assertNumQueries(2):
+            counts = session_bucket_counts(self.session.id)
+        self.assertEqual(sorted(counts.values()), [1, 1])
+        # Deletes aren't seen by the id cursor; they reset the counts
+        AttendanceRecord.objects.filter(student=self.students[0]).delete()
+        self.assertEqual(sum(session_bucket_counts(self.session.id).values()), 1)
+
+    def test_course_peaks_per_room(self):
+        other = AttendanceSession.objects.create(
+            name='Lab', course_code='CS101', created_by=self.admin, location='',
+            start_time=self.session.start_time, end_time=self.session.end_time,
+        )
+        for i in range(4):
+            self.scan(self.students[i], i)
+        self.scan(self.students[4], 0, session=other)
+        peaks = course_arrival_peaks('CS101', AttendanceSession.objects.filter(created_by=self.admin))
+        self.assertEqual(
+            [(room['location'], room['sessions'], room['peak_per_minute']) for room in peaks],
+            [('Room 1', 1, 4), ('Unspecified', 1, 1)],
+        )
+        self.assertEqual(course_arrival_peaks('CS101', AttendanceSession.objects.none()), [])
+
+class CheckinTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        throttling._local_store.buckets.clear()
+        now = timezone.now()
+        self.session = AttendanceSession.objects.create(
+            name='Lecture', course_code='CS101', created_by=User.objects.create_user('admin1'),
+            start_time=now - timedelta(minutes=5), end_time=now + timedelta(hours=1),
+        )
+        self.students = [
+            Student.objects.create(user=User.objects.create_user(f's{i}'), student_id=f'S{i}', department='CS')
+            for i in range(4)
+        ]
+
+    def checkin(self, student, qr_data=None):
+        self.client.force_login(student.user)
+        qr_data = qr_data or session_qr.session_payload(self.session.id)[0]
+        return self.client.post(
+            '/api/checkin/', json.dumps({'qr_data': qr_data}), content_type='application/json',
+            HTTP_USER_AGENT='Mobile Safari', REMOTE_ADDR='10.0.0.1',
+        ).json()
+
+    def test_checkin_and_roster(self):
+        self.assertTrue(self.checkin(self.students[0])['success'])
+        self.assertEqual(AttendanceRecord.objects.get().source, 'checkin')
+        self.assertFalse(self.checkin(self.students[0])['success'])
+        self.assertFalse(self.checkin(self.students[1], 'SQ:1:0:forged')['success'])
+        Enrollment.objects.enroll('CS101', [self.students[0]])
+        self.assertEqual(self.checkin(self.students[1])['message'], 'You are not enrolled in CS101!')
+
+    def test_phones_sharing_a_browser_and_address_are_not_flagged(self):
+        detector = ScanAnomalyDetector({**anomaly_rules(), 'SHARED_IP_THRESHOLD': 2, 'SHARED_DEVICE_THRESHOLD': 2})
+        with mock.patch('attendance.views.anomaly_detector', detector):
+            for student in self.students:
+                self.assertTrue(self.checkin(student)['success'])
+        self.assertFalse(ScanAnomaly.objects.exists())
+        for record in AttendanceRecord.objects.all():
+            self.assertEqual(detector.check(record), [])
+        # Still arrivals
+        self.assertEqual(sum(session_bucket_counts(self.session.id).values()), 4)
+
+class CursorTests(TestCase):
+    def test_round_trip(self):
+        state = decode_cursor(encode_cursor({'mode': 'updated', 'id': 7, 'edit_id': 3, 'updated_at': '2026-01-01T00:00:00+00:00'}))
+        self.assertEqual((state['id'], state['edit_id']), (7, 3))
+        self.assertEqual(state['updated_at'].year, 2026)
+
+    def test_cursor_without_edit_id(self):
+        state = decode_cursor(encode_cursor({'mode': 'updated', 'id': 7, 'updated_at': '2026-01-01T00:00:00+00:00'}))
+        self.assertEqual(state['edit_id'], 0)
+
+    def test_invalid_cursors(self):
+        for cursor in ['', 'not base64!', encode_cursor({'mode': 'sideways', 'id': 1}), encode_cursor({'mode': 'id'}),
+                       encode_cursor({'mode': 'updated', 'id': 1, 'updated_at': 'yesterday'})]:
+            with self.assertRaises(ValueError):
+                decode_cursor(cursor)
+
+@override_settings(ATTENDANCE_FEED_SETTLE_SECONDS=0)
+@mock.patch('attendance.warehouse.PAGE_SIZE', 2)
+class RecordsFeedTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user('admin1')
+        AdminProfile.objects.create(user=self.admin, department='CS')
+        other = User.objects.create_user('admin2')
+        AdminProfile.objects.create(user=other, department='CS')
+        now = timezone.now()
+        self.session = AttendanceSession.objects.create(
+            name='Lecture', course_code='CS101', created_by=self.admin,
+            start_time=now - timedelta(minutes=5), end_time=now + timedelta(hours=1),
+        )
+        self.other_session = AttendanceSession.objects.create(
+            name='Lab', course_code='CS102', created_by=other,
+            start_time=now - timedelta(minutes=5), end_time=now + timedelta(hours=1),
+        )
+        self.students = [
+            Student.objects.create(user=User.objects.create_user(f's{i}'), student_id=f'S{i}', department='CS')
+            for i in range(5)
+        ]
+        for student in self.students:
+            AttendanceRecord.objects.create(session=self.session, student=student)
+        AttendanceRecord.objects.create(session=self.other_session, student=self.students[0])
+        self.client.force_login(self.admin)
+
+    def load(self, **params):
+        response = self.client.get('/api/records/feed/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        body = zlib.decompress(b''.join(response.streaming_content), 31)
+        return [json.loads(line) for line in body.decode().splitlines()]
+
+    def test_full_load_in_pages(self):
+        lines = self.load()
+        rows = [line for line in lines if 'cursor' not in line]
+        self.assertEqual(sorted(row['student_id'] for row in rows), ['S0', 'S1', 'S2', 'S3', 'S4'])
+        self.assertEqual({row['course_code'] for row in rows}, {'CS101'})
+        self.assertEqual(len([line for line in lines if 'cursor' in line]), 4)
+        self.assertTrue(lines[-1]['complete'])
+
+    def test_resume_from_page_cursor(self):
+        lines = self.load()
+        first_cursor = next(line['cursor'] for line in lines if 'cursor' in line)
+        resumed = [line for line in self.load(cursor=first_cursor) if 'cursor' not in line]
+        self.assertEqual(sorted(row['student_id'] for row in resumed), ['S2', 'S3', 'S4'])
+
+    def test_incremental_load_with_tombstones(self):
+        since = timezone.now() - timedelta(minutes=1)
+        cursor = self.load(updated_since=since.isoformat())[-1]['cursor']
+        self.assertEqual([line for line in self.load(cursor=cursor) if 'cursor' not in line], [])
+
+        apply_bulk_edit(self.session, ['S1'], 'unmark', self.admin, 'Left early')
+        lines = [line for line in self.load(cursor=cursor) if 'cursor' not in line]
+        self.assertEqual(len(lines), 1)
+        self.assertTrue(lines[0]['deleted'])
+        self.assertEqual((lines[0]['student_id'], lines[0]['course_code']), ('S1', 'CS101'))
+
+    def test_invalid_params(self):
+        self.assertEqual(self.client.get('/api/records/feed/', {'cursor': 'junk'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/records/feed/', {'updated_since': 'yesterday'}).status_code, 400)
+
+class AbsenceRunsTests(TestCase):
+    def test_runs_reset_on_attendance(self):
+        absent = np.array([
+            [True, True, False, True, True, True],
+            [False, False, False, False, False, False],
+        ])
+        runs = absence_runs(absent)
+        self.assertEqual(runs[0].tolist(), [1, 2, 0, 1, 2, 3])
+        self.assertEqual(runs[1].tolist(), [0] * 6)
+
+class BulkEditTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user('admin1')
+        AdminProfile.objects.create(user=self.admin, department='CS')
+        now = timezone.now()
+        self.session = AttendanceSession.objects.create(
+            name='Lecture', course_code='CS101', created_by=self.admin,
+            start_time=now - timedelta(minutes=5), end_time=now + timedelta(hours=1),
+        )
+        self.students = [
+            Student.objects.create(user=User.objects.create_user(f's{i}'), student_id=f'S{i}', department='CS')
+            for i in range(4)
+        ]
+        self.scanned = AttendanceRecord.objects.create(session=self.session, student=self.students[0])
+
+    def present(self):
+        return sorted(AttendanceRecord.objects.filter(session=self.session).values_list('student__student_id', flat=True))
+
+    def test_mark(self):
+        result = apply_bulk_edit(self.session, ['S0', 'S1', 'S2', 'NOPE'], 'mark', self.admin, 'Scanner down')
+        self.assertEqual(result, {'changed': ['S1', 'S2'], 'unchanged': ['S0'], 'unknown': ['NOPE']})
+        self.assertEqual(self.present(), ['S0', 'S1', 'S2'])
+        self.assertEqual(
+            sorted(AttendanceRecord.objects.filter(source='manual').values_list('student__student_id', flat=True)), ['S1', 'S2']
+        )
+        self.assertEqual(
+            sorted(AttendanceEdit.objects.filter(action='mark', reason='Scanner down').values_list('student__student_id', flat=True)),
+            ['S1', 'S2'],
+        )
+        self.assertEqual(student_history(self.students[1])[0].session, self.session)
+
+    def test_scan_landing_first_is_not_reported_as_marked(self):
+        bulk_create = AttendanceRecord.objects.bulk_create
+
+        def scan_first(objs, **kwargs):
+            AttendanceRecord.objects.create(session=self.session, student=self.students[1])
+            return bulk_create(objs, **kwargs)
+
+        with mock.patch.object(AttendanceRecord.objects, 'bulk_create', side_effect=scan_first):
+            result = apply_bulk_edit(self.session, ['S1', 'S2'], 'mark', self.admin)
+        self.assertEqual(result['changed'], ['S2'])
+        self.assertEqual(list(AttendanceEdit.objects.values_list('student__student_id', flat=True)), ['S2'])
+        self.assertEqual(AttendanceRecord.objects.get(student=self.students[1]).source, 'scan')
+
+    def test_unmark(self):
+        anomaly = ScanAnomaly.objects.create(
+            session=self.session, record=self.scanned, kind='shared_ip', key='10.0.0.1', observed_at=timezone.now(),
+        )
+        records_version = versions.get(versions.records_key(self.session.id))
+        bitmaps.at_risk(['CS101'])  # build the index
+        result = apply_bulk_edit(self.session, ['S0', 'S1'], 'unmark', self.admin)
+        self.assertEqual(result, {'changed': ['S0'], 'unchanged': ['S1'], 'unknown': []})
+        self.assertEqual(self.present(), [])
+        anomaly.refresh_from_db()
+        self.assertIsNone(anomaly.record_id)
+        edit = AttendanceEdit.objects.get()
+        self.assertEqual((edit.action, edit.record_id), ('unmark', self.scanned.id))
+        # The batch's side effects ran once, not the per-record signal work
+        self.assertEqual(versions.peek(versions.records_key(self.session.id)), records_version + 1)
+        bits = AttendanceBitset.objects.get(course_code='CS101', student=self.students[0]).bits
+        self.assertFalse(any(bits))
+
+    def test_unmark_queries_do_not_grow_with_students(self):
+        for student in self.students[1:]:
+            AttendanceRecord.objects.create(session=self.session, student=student)
+        apply_bulk_edit(self.session, ['S0'], 'unmark', self.admin)  # creates the stamps
+        with CaptureQueriesContext(connection) as one:
+            apply_bulk_edit(self.session, ['S1'], 'unmark', self.admin)
+        with CaptureQueriesContext(connection) as two:
+            apply_bulk_edit(self.session, ['S2', 'S3'], 'unmark', self.admin)
+        self.assertEqual(len(one), len(two))
+
+    def test_api_with_pasted_roster(self):
+        self.client.force_login(self.admin)
+        response = self.client.post(
+            f'/api/session/{self.session.id}/attendance/bulk/', json.dumps({'action': 'mark', 'roster': 'S1, S2\nS3'}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.json()['changed'], ['S1', 'S2', 'S3'])
+
+class AtRiskTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user('admin1')
+        self.other = User.objects.create_user('admin2')
+        now = timezone.now()
+        self.sessions = [
+            AttendanceSession.objects.create(
+                name=f'L{i}', course_code='CS101', created_by=self.admin if i < 4 else self.other,
+                start_time=now - timedelta(days=10 - i), end_time=now - timedelta(days=10 - i, hours=-1),
+            )
+            for i in range(6)
+        ]
+        self.regular = Student.objects.create(user=User.objects.create_user('s1'), student_id='S1', department='CS')
+        self.absent = Student.objects.create(user=User.objects.create_user('s2'), student_id='S2', department='CS')
+        for session in self.sessions:
+            AttendanceRecord.objects.create(session=session, student=self.regular)
+        # S2 only came to the other admin's sessions
+        for session in self.sessions[4:]:
+            AttendanceRecord.objects.create(session=session, student=self.absent)
+
+    def test_flags_low_attendance_and_streaks(self):
+        flagged = bitmaps.at_risk(['CS101'], below=75, streak=3)
+        self.assertEqual([row['student_id'] for row in flagged], ['S2'])
+        self.assertEqual((flagged[0]['attended'], flagged[0]['held'], flagged[0]['longest_absence_streak']), (2, 6, 4))
+
+    def test_scoped_to_sessions(self):
+        mine = AttendanceSession.objects.filter(created_by=self.admin)
+        theirs = AttendanceSession.objects.filter(created_by=self.other)
+        self.assertEqual(bitmaps.at_risk(['CS101'], below=75, streak=3, sessions_queryset=theirs), [])
+        # S2 only ever came to the other admin's sessions, so isn't one of this admin's students
+        everyone = bitmaps.at_risk(['CS101'], below=101, streak=0, sessions_queryset=mine)
+        self.assertEqual([row['student_id'] for row in everyone], ['S1'])
+        self.assertEqual([student['student_id'] for student in CourseMatrix.build('CS101', mine).students], ['S1'])
+
+        # Unless they are on the course roster
+        Enrollment.objects.enroll('CS101', [self.absent])
+        flagged = bitmaps.at_risk(['CS101'], below=75, streak=3, sessions_queryset=mine)
+        self.assertEqual([row['student_id'] for row in flagged], ['S2'])
+        self.assertEqual((flagged[0]['attended'], flagged[0]['held'], flagged[0]['percentage']), (0, 4, 0.0))
+
+    def test_index_follows_new_sessions_and_scans(self):
+        bitmaps.at_risk(['CS101'])
+        now = timezone.now()
+        session = AttendanceSession.objects.create(
+            name='L6', course_code='CS101', created_by=self.admin, start_time=now - timedelta(minutes=5), end_time=now,
+        )
+        AttendanceRecord.objects.create(session=session, student=self.absent)
+        flagged = {row['student_id']: row for row in bitmaps.at_risk(['CS101'], below=101, streak=0)}
+        self.assertEqual((flagged['S2']['attended'], flagged['S2']['held']), (3, 7))
+
+# Multi-process cache coherence. Each worker is a forked process with its own
+# locmem cache, reading and writing the same SQLite test database.
+
+def _run(command, *args):
+    if command == 'history':
+        return [record.session.name for record in student_history(Student.objects.get(pk=args[0]))]
+    if command == 'active':
+        return sorted(session.name for session in active_sessions()[0])
+    if command == 'arrivals':
+        return sum(session_bucket_counts(args[0]).values())
+    if command == 'scan':
+        return AttendanceRecord.objects.create(session_id=args[0], student_id=args[1]).pk
+    if command == 'rename':
+        session = AttendanceSession.objects.get(pk=args[0])
+        session.name = args[1]
+        session.save()
+        return None
+    if command == 'unmark':
+        session = AttendanceSession.objects.get(pk=args[0])
+        return apply_bulk_edit(session, [args[1]], 'unmark', session.created_by)['changed']
+    raise ValueError(command)
+
+def _worker(conn):
+    cache.clear()  # forget the parent's copy; this process starts cold
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                result = _run(*message)
+            conn.send(('ok', result, len(queries)))
+        except Exception as e:
+            conn.send(('error', repr(e), 0))
+    connections.close_all()
+
+@unittest.skipUnless('fork' in multiprocessing.get_all_start_methods(), 'needs fork')
+class CacheCoherenceTests(TransactionTestCase):
+    def setUp(self):
+        admin = User.objects.create_user('admin1')
+        self.student = Student.objects.create(user=User.objects.create_user('s1'), student_id='S1', department='CS')
+        now = timezone.now()
+        self.session = AttendanceSession.objects.create(
+            name='Lecture', course_code='CS101', created_by=admin,
+            start_time=now - timedelta(minutes=5), end_time=now + timedelta(hours=1),
+        )
+        # Children must open their own connections to the shared file
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        self.workers = []
+        for _ in range(3):
+            parent_end, child_end = context.Pipe()
+            process = context.Process(target=_worker, args=(child_end,), daemon=True)
+            process.start()
+            self.workers.append((process, parent_end))
+
+    def tearDown(self):
+        for process, conn in self.workers:
+            conn.send(None)
+            process.join(10)
+            if process.is_alive():
+                process.terminate()
+
+    def call(self, worker, *message):
+        conn = self.workers[worker][1]
+        conn.send(message)
+        self.assertTrue(conn.poll(30), f'worker {worker} did not answer {message}')
+        status, result, queries = conn.recv()
+        self.assertEqual(status, 'ok', result)
+        return result, queries
+
+    def read_all(self, worker):
+        return (
+            self.call(worker, 'history', self.student.pk)[0],
+            self.call(worker, 'active')[0],
+            self.call(worker, 'arrivals', self.session.pk)[0],
+        )
+
+    def test_writes_in_one_worker_reach_the_others(self):
+        writer, readers = 0, (1, 2)
+        for reader in readers:
+            self.assertEqual(self.read_all(reader), ([], ['Lecture'], 0))
+        # Unchanged data comes from the local copy: the student row and two stamp lookups
+        self.assertEqual(self.call(1, 'history', self.student.pk), ([], 3))
+
+        self.call(writer, 'scan', self.session.pk, self.student.pk)
+        for reader in readers:
+            self.assertEqual(self.read_all(reader), (['Lecture'], ['Lecture'], 1))
+
+        self.call(writer, 'rename', self.session.pk, 'Renamed')
+        for reader in readers:
+            self.assertEqual(self.read_all(reader), (['Renamed'], ['Renamed'], 1))
+
+        self.assertEqual(self.call(writer, 'unmark', self.session.pk, 'S1')[0], ['S1'])
+        for reader in readers:
+            self.assertEqual(self.read_all(reader), ([], ['Renamed'], 0))
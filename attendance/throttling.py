@@ -0,0 +1,116 @@
+# attendance/throttling.py
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+DEFAULT_THROTTLE_RATES = {
+    'qr': '20/min',
+    'scan': '240/min',
+    # Per attendance session: 10 stations at the default 5 s a scan (see arrivals.py),
+    # and half the admin's budget, so one stuck session can't starve another
+    'scan_session': '120/min',
+    'checkin': '10/min',
+}
+
+PERIODS = {'s': 1, 'sec': 1, 'm': 60, 'min': 60, 'h': 3600, 'hour': 3600}
+
+def parse_rate(rate):
+    """Turn '20/min' into (capacity, tokens added per second)"""
+    num, period = rate.split('/')
+    capacity = int(num)
+    return capacity, capacity / PERIODS[period.strip().lower()]
+
+def get_rate(scope):
+    rates = {**DEFAULT_THROTTLE_RATES, **getattr(settings, 'ATTENDANCE_THROTTLE_RATES', {})}
+    return parse_rate(rates[scope])
+
+def take_token(state, capacity, refill_rate, now):
+    """Refill a (tokens, updated) bucket state and try to take one token.
+    Returns (new_state, seconds to wait); a wait of 0 means the request is allowed."""
+    if state is None:
+        tokens = capacity
+    else:
+        tokens, updated = state
+        tokens = min(capacity, tokens + (now - updated) * refill_rate)
+
+    if tokens >= 1:
+        return (tokens - 1, now), 0
+    return (tokens, now), (1 - tokens) / refill_rate
+
+class LocalBucketStore:
+    """Per-process buckets. Least recently used keys are dropped past MAX_KEYS."""
+    MAX_KEYS = 10000
+
+    def __init__(self):
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def consume(self, key, capacity, refill_rate):
+        with self.lock:
+            state, wait = take_token(self.buckets.get(key), capacity, refill_rate, time.monotonic())
+            self.buckets[key] = state
+            self.buckets.move_to_end(key)
+            if len(self.buckets) > self.MAX_KEYS:
+                self.buckets.popitem(last=False)
+        return wait
+
+class CacheBucketStore:
+    """Buckets kept in a Django cache so all workers share them.
+    The read-modify-write is not atomic, so concurrent workers may let a few
+    extra requests through; that is fine for abuse protection."""
+
+    def __init__(self, alias):
+        self.cache = caches[alias]
+
+    def consume(self, key, capacity, refill_rate):
+        cache_key = f'throttle:{key}'
+        state, wait = take_token(self.cache.get(cache_key), capacity, refill_rate, time.time())
+        # Expire once the bucket would be full again anyway
+        self.cache.set(cache_key, state, timeout=int(capacity / refill_rate) + 1)
+        return wait
+
+_local_store = LocalBucketStore()
+_stats = {}
+_stats_lock = threading.Lock()
+
+def get_store():
+    alias = getattr(settings, 'ATTENDANCE_THROTTLE_CACHE', None)
+    if alias:
+        return CacheBucketStore(alias)
+    return _local_store
+
+def check_throttle(request, scope, session_id=None):
+    """Take a token from the user's bucket for this scope and, when an attendance
+    session is given, from that session's bucket (rate '<scope>_session').
+    Returns the number of seconds to wait, or 0 if the request may proceed."""
+    store = get_store()
+    buckets = [(f'{scope}:user:{request.user.pk}', get_rate(scope))]
+    if session_id is not None:
+        buckets.append((f'{scope}:session:{session_id}', get_rate(f'{scope}_session')))
+
+    wait = 0
+    for key, (capacity, refill_rate) in buckets:
+        # A refused request doesn't spend tokens from the remaining buckets
+        wait = store.consume(key, capacity, refill_rate)
+        if wait:
+            break
+
+    with _stats_lock:
+        counts = _stats.setdefault(scope, {'allowed': 0, 'throttled': 0})
+        counts['throttled' if wait else 'allowed'] += 1
+    return wait
+
+def throttle_stats():
+    """Allowed/throttled counts per scope for this process"""
+    with _stats_lock:
+        stats = {}
+        for scope, counts in _stats.items():
+            total = counts['allowed'] + counts['throttled']
+            stats[scope] = {
+                **counts,
+                'hit_rate': counts['throttled'] / total if total else 0.0,
+            }
+        return stats
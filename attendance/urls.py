@@ -14,17 +14,39 @@ urlpatterns = [
     path('student/dashboard/', views.student_dashboard, name='student_dashboard'),
     path('student/get-qr/', views.get_qr_code, name='get_qr_code'),
     path('student/history/', views.attendance_history, name='attendance_history'),
+    path('student/checkin/', views.student_checkin, name='student_checkin'),
     
     # Admin views
     path('admin/dashboard/', views.admin_dashboard, name='admin_dashboard'),
     path('admin/session/create/', views.create_session, name='create_session'),
     path('admin/session/<int:session_id>/scan/', views.scan_qr, name='scan_qr'),
+    path('admin/session/<int:session_id>/display/', views.session_display, name='session_display'),
     path('admin/session/<int:session_id>/attendance/', views.view_session_attendance, name='view_attendance'),
+    path('admin/session/<int:session_id>/attendance/bulk/', views.bulk_attendance, name='bulk_attendance'),
     path('admin/session/<int:session_id>/export/csv/', views.export_attendance_csv, name='export_csv'),
     path('admin/session/<int:session_id>/export/excel/', views.export_attendance_excel, name='export_excel'),
+    path('admin/session/<int:session_id>/export/absentees/', views.export_absentees_csv, name='export_absentees_csv'),
+    path('admin/course/<str:course_code>/export/absentees/', views.export_course_absentees_csv, name='export_course_absentees_csv'),
+    path('admin/course/<str:course_code>/export/matrix/csv/', views.export_course_matrix, {'fmt': 'csv'}, name='export_course_matrix_csv'),
+    path('admin/course/<str:course_code>/export/matrix/excel/', views.export_course_matrix, {'fmt': 'excel'}, name='export_course_matrix_excel'),
     path('admin/students/', views.manage_students, name='manage_students'),
+    path('admin/enrollment/', views.manage_enrollment, name='manage_enrollment'),
+    path('admin/exports/<int:job_id>/download/', views.download_export, name='download_export'),
+    path('admin/profiles/', views.profile_captures, name='profile_captures'),
+    path('admin/profiles/<str:name>.<str:kind>', views.download_profile, name='download_profile'),
     
     # API endpoints
     path('api/session/<int:session_id>/scan/', views.api_scan_qr, name='api_scan_qr'),
+    path('api/session/<int:session_id>/display-code/', views.api_session_display_code, name='api_session_display_code'),
+    path('api/session/<int:session_id>/attendance/bulk/', views.api_bulk_attendance, name='api_bulk_attendance'),
+    path('api/checkin/', views.api_checkin, name='api_checkin'),
+    path('api/session/<int:session_id>/records/', views.api_session_records, name='api_session_records'),
+    path('api/session/<int:session_id>/arrivals/', views.api_session_arrivals, name='api_session_arrivals'),
+    path('api/course/<str:course_code>/arrivals/', views.api_course_arrivals, name='api_course_arrivals'),
+    path('api/records/feed/', views.api_records_feed, name='api_records_feed'),
+    path('api/exports/', views.api_create_export, name='api_create_export'),
+    path('api/exports/<int:job_id>/', views.api_export_status, name='api_export_status'),
+    path('api/at-risk/', views.api_at_risk, name='api_at_risk'),
+    path('api/throttle/stats/', views.api_throttle_stats, name='api_throttle_stats'),
 ]
 
@@ -0,0 +1,79 @@
+# attendance/versions.py
+# Version stamps shared by every worker process. Cached data stays in each
+# worker's own memory (the locmem cache), but its keys carry a stamp read from
+# the VersionStamp table. A write in any worker bumps the stamp in the same
+# database transaction, so every other worker moves to a fresh key on its
+# next read instead of serving its old copy. A stamp read is one lookup on
+# a unique index.
+import time
+
+from django.db import DatabaseError, IntegrityError, router, transaction
+from django.db.models import F
+
+from .models import VersionStamp
+
+# Stamps live on the primary: one read from a lagging replica would hide new
+# writes. snapshot() is the exception, for data read from that same replica.
+DB = 'default'
+
+def _seed():
+    # The clock rather than 0, so stamps aren't reissued if the table is cleared
+    return int(time.time() * 1000)
+
+def peek(key):
+    """Current stamp, or None if nothing has been versioned under the key yet"""
+    return VersionStamp.objects.using(DB).filter(key=key).values_list('version', flat=True).first()
+
+def get(key):
+    """Current stamp, creating it if needed"""
+    version = peek(key)
+    if version is None:
+        stamp, _ = VersionStamp.objects.using(DB).get_or_create(key=key, defaults={'version': _seed()})
+        version = stamp.version
+    return version
+
+def snapshot(*keys):
+    """(database alias, [stamps]) to build cached data from. Inside reads_from_replica
+    views that is the replica: it is a consistent copy of the primary, stamps
+    included, so data read there is cached under the replica's own stamps and
+    never under newer ones. Keys the snapshot doesn't have yet use the primary."""
+    alias = router.db_for_read(VersionStamp)
+    if alias != DB:
+        try:
+            found = dict(VersionStamp.objects.using(alias).filter(key__in=keys).values_list('key', 'version'))
+        except DatabaseError:
+            # Snapshot taken before this table existed
+            found = {}
+        if all(key in found for key in keys):
+            return alias, [found[key] for key in keys]
+    return DB, [get(key) for key in keys]
+
+def bump(*keys):
+    """Move the stamps on; one UPDATE for keys that already exist"""
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return
+    stamps = VersionStamp.objects.using(DB)
+    if stamps.filter(key__in=keys).update(version=F('version') + 1) == len(keys):
+        return
+    existing = set(stamps.filter(key__in=keys).values_list('key', flat=True))
+    for key in keys:
+        if key in existing:
+            continue
+        try:
+            with transaction.atomic(using=DB):
+                stamps.create(key=key, version=_seed())
+        except IntegrityError:
+            # Another worker created it since; it may have cached under that stamp
+            stamps.filter(key=key).update(version=F('version') + 1)
+
+def records_key(session_id):
+    return f'attendance:session:{session_id}:records_version'
+
+def student_key(student_id):
+    return f'attendance:student:{student_id}:version'
+
+def admin_dashboard_key(user_id):
+    return f'attendance:admin:{user_id}:dashboard_version'
+
+SESSIONS_KEY = 'attendance:sessions:version'
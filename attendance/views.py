@@ -3,17 +3,34 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse, HttpResponseNotModified, FileResponse, Http404
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
+from django.urls import reverse
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef
 import json
 import csv
 import pandas as pd
 from io import BytesIO
+from tempfile import SpooledTemporaryFile
 
-from .models import Student, AttendanceSession, AttendanceRecord, QRCode, AdminProfile
-from .forms import StudentRegistrationForm, AdminRegistrationForm, LoginForm, AttendanceSessionForm, QRScanForm
-from .decorators import student_required, admin_required
+from .models import Student, AttendanceSession, AttendanceRecord, QRCode, AdminProfile, Device, Enrollment, ExportJob, AttendanceEdit
+from .forms import StudentRegistrationForm, AdminRegistrationForm, LoginForm, AttendanceSessionForm, QRScanForm, EnrollmentForm, BulkAttendanceForm, split_student_ids
+from .decorators import student_required, admin_required, throttle, reads_from_replica
+from .throttling import throttle_stats
+from .signals import session_records_version, ensure_session_records_version, session_owner
+from .dashboards import active_sessions as cached_active_sessions, admin_session_lists, student_history
+from .profiling import list_captures, capture_path, profiler_settings
+from .anomalies import detector as anomaly_detector
+from .exports import normalize_params, submit_export
+from .qr_payload import parse_qr_payload
+from .reports import CourseMatrix
+from .arrivals import session_arrivals, course_arrival_peaks
+from .session_qr import session_payload, verify_session_payload, rotate_seconds
+from .warehouse import parse_feed_params, feed
+from .corrections import apply_bulk_edit, MAX_STUDENT_IDS
+from .bitmaps import at_risk, course_codes_for
 
 def home(request):
     if request.user.is_authenticated:
@@ -78,9 +95,11 @@ def user_logout(request):
 
 @login_required
 @student_required
+@reads_from_replica
 def student_dashboard(request):
     student = request.user.student_profile
-    active_sessions = AttendanceSession.objects.filter(is_active=True, end_time__gte=timezone.now())
+    # Same list for every student; the template caches its rendered card as well
+    active_sessions, active_sessions_ttl, sessions_version = cached_active_sessions()
     
     # Generate new QR code
     qr_code = student.generate_qr_code()
@@ -88,12 +107,15 @@ def student_dashboard(request):
     context = {
         'student': student,
         'active_sessions': active_sessions,
+        'active_sessions_ttl': active_sessions_ttl,
+        'sessions_version': sessions_version,
         'qr_code': qr_code,
     }
     return render(request, 'attendance/student_dashboard.html', context)
 
 @login_required
 @student_required
+@throttle('qr')
 def get_qr_code(request):
     """API endpoint to get fresh QR code data"""
     student = request.user.student_profile
@@ -107,9 +129,11 @@ def get_qr_code(request):
 
 @login_required
 @student_required
+@reads_from_replica
 def attendance_history(request):
     student = request.user.student_profile
-    records = AttendanceRecord.objects.filter(student=student).order_by('-timestamp')
+    # Cached until one of the student's records or any session changes
+    records = student_history(student)
     
     context = {
         'records': records,
@@ -118,27 +142,17 @@ def attendance_history(request):
 
 @login_required
 @admin_required
+@reads_from_replica
 def admin_dashboard(request):
     admin = request.user.admin_profile
-    today = timezone.now().date()
     
-    # Get today's sessions created by this admin
-    today_sessions = AttendanceSession.objects.filter(
-        created_by=request.user,
-        start_time__date=today
-    )
-    
-    # Get active sessions
-    active_sessions = AttendanceSession.objects.filter(
-        created_by=request.user,
-        is_active=True,
-        end_time__gte=timezone.now()
-    )
+    # Today's and active sessions created by this admin, cached until they change
+    lists = admin_session_lists(request.user)
     
     context = {
         'admin': admin,
-        'today_sessions': today_sessions,
-        'active_sessions': active_sessions,
+        'today_sessions': lists['today_sessions'],
+        'active_sessions': lists['active_sessions'],
     }
     return render(request, 'attendance/admin_dashboard.html', context)
 
@@ -174,49 +188,52 @@ def scan_qr(request, session_id):
             
             # Parse QR data
             try:
-                if qr_data.startswith('ATT:'):
-                    parts = qr_data.split(':')
-                    if len(parts) >= 3:
-                        student_id = parts[1]
-                        token = parts[2]
-                        
-                        # Find student and valid QR code
-                        student = get_object_or_404(Student, student_id=student_id)
-                        qr_code = QRCode.objects.filter(
+                payload = parse_qr_payload(qr_data)
+                if payload:
+                    student_id, token = payload
+                    
+                    # Find student and valid QR code
+                    student = get_object_or_404(
+                        Student.objects.with_enrollment(session.course_code).select_related('user'),
+                        student_id=student_id
+                    )
+                    qr_code = QRCode.objects.filter(
+                        student=student,
+                        token=token,
+                        is_used=False,
+                        expires_at__gte=timezone.now()
+                    ).first()
+                    
+                    if student.course_has_roster and not student.is_enrolled:
+                        messages.error(request, f'{student.user.get_full_name()} is not enrolled in {session.course_code}!')
+                    elif qr_code:
+                        # Check if already marked
+                        existing_record = AttendanceRecord.objects.filter(
                             student=student,
-                            token=token,
-                            is_used=False,
-                            expires_at__gte=timezone.now()
+                            session=session
                         ).first()
                         
-                        if qr_code:
-                            # Check if already marked
-                            existing_record = AttendanceRecord.objects.filter(
-                                student=student,
-                                session=session
-                            ).first()
-                            
-                            if existing_record:
-                                messages.warning(request, f'{student.user.get_full_name()} is already marked present!')
-                            else:
-                                # Create attendance record
-                                AttendanceRecord.objects.create(
+                        if existing_record:
+                            messages.warning(request, f'{student.user.get_full_name()} is already marked present!')
+                        else:
+                            # Create attendance record and mark the QR as used; one commit
+                            # for both and the version stamps the record's signal bumps
+                            with transaction.atomic():
+                                record = AttendanceRecord.objects.create(
                                     student=student,
                                     session=session,
                                     qr_code=qr_code,
                                     ip_address=request.META.get('REMOTE_ADDR'),
-                                    device_info=request.META.get('HTTP_USER_AGENT', '')
+                                    device_id=Device.objects.intern(request.META.get('HTTP_USER_AGENT', ''))
                                 )
-                                
-                                # Mark QR as used
                                 qr_code.is_used = True
                                 qr_code.save()
-                                
-                                messages.success(request, f'Attendance marked for {student.user.get_full_name()}!')
-                        else:
-                            messages.error(request, 'Invalid or expired QR code!')
+                            
+                            anomaly_detector.observe(record)
+                            
+                            messages.success(request, f'Attendance marked for {student.user.get_full_name()}!')
                     else:
-                        messages.error(request, 'Invalid QR code format!')
+                        messages.error(request, 'Invalid or expired QR code!')
                 else:
                     messages.error(request, 'Invalid QR code!')
             except Exception as e:
@@ -238,16 +255,278 @@ def scan_qr(request, session_id):
 @admin_required
 def view_session_attendance(request, session_id):
     session = get_object_or_404(AttendanceSession, id=session_id, created_by=request.user)
-    records = AttendanceRecord.objects.filter(session=session).select_related('student', 'student__user')
+    records = list(
+        AttendanceRecord.objects.filter(session=session).select_related('student', 'student__user').order_by('id')
+    )
+    absentees = Student.objects.absent_from(session).select_related('user').order_by('student_id')
+    anomalies = session.anomalies.select_related('record__student')[:50]
     
     context = {
         'session': session,
         'records': records,
+        'cursor': records[-1].id if records else 0,
+        'absentees': absentees,
+        'anomalies': anomalies,
+        'arrivals': session_arrivals(session),
     }
     return render(request, 'attendance/view_attendance.html', context)
 
 @login_required
 @admin_required
+def api_session_arrivals(request, session_id):
+    """Scans per 10 s bucket with the queue `?stations=N` scanner stations would have had"""
+    session = get_object_or_404(AttendanceSession, id=session_id, created_by=request.user)
+    try:
+        stations = int(request.GET.get('stations') or 0)
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Invalid station count'}, status=400)
+    if stations < 0:
+        return JsonResponse({'success': False, 'message': 'Invalid station count'}, status=400)
+    
+    return JsonResponse({'success': True, 'session_id': session.id, **session_arrivals(session, stations or None)})
+
+@login_required
+@admin_required
+@reads_from_replica
+def api_course_arrivals(request, course_code):
+    """Peak arrival rates of the admin's sessions of a course, per room"""
+    rooms = course_arrival_peaks(course_code, AttendanceSession.objects.filter(created_by=request.user))
+    return JsonResponse({'success': True, 'course_code': course_code, 'rooms': rooms})
+
+@login_required
+@admin_required
+def bulk_attendance(request, session_id):
+    """Mark or unmark many students at once, e.g. when the scanner is down"""
+    session = get_object_or_404(AttendanceSession, id=session_id, created_by=request.user)
+    
+    if request.method == 'POST':
+        form = BulkAttendanceForm(request.POST)
+        if form.is_valid():
+            action = form.cleaned_data['action']
+            result = apply_bulk_edit(
+                session, form.cleaned_data['student_ids'], action, request.user, form.cleaned_data['reason']
+            )
+            verb = 'Marked' if action == 'mark' else 'Unmarked'
+            messages.success(request, f'{verb} {len(result["changed"])} students.')
+            if result['unchanged']:
+                state = 'already present' if action == 'mark' else 'not marked'
+                messages.info(request, f'{len(result["unchanged"])} students were {state}.')
+            if result['unknown']:
+                messages.warning(request, f'Unknown student IDs: {", ".join(result["unknown"])}')
+            return redirect('bulk_attendance', session_id=session.id)
+    else:
+        form = BulkAttendanceForm()
+    
+    context = {
+        'session': session,
+        'form': form,
+        'edits': AttendanceEdit.objects.filter(session=session).select_related('student', 'edited_by')[:100],
+    }
+    return render(request, 'attendance/bulk_attendance.html', context)
+
+@login_required
+@admin_required
+def api_bulk_attendance(request, session_id):
+    """POST {"action": "mark"|"unmark", "student_ids": [...] or "roster": "<pasted text>", "reason": ""}"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': 'Invalid request method'}, status=405)
+    session = get_object_or_404(AttendanceSession, id=session_id, created_by=request.user)
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'message': 'Invalid JSON data'}, status=400)
+    
+    action = data.get('action')
+    if action not in ('mark', 'unmark'):
+        return JsonResponse({'success': False, 'message': 'action must be "mark" or "unmark"'}, status=400)
+    if isinstance(data.get('student_ids'), list):
+        student_ids = list(dict.fromkeys(str(student_id).strip() for student_id in data['student_ids']))
+        student_ids = [student_id for student_id in student_ids if student_id]
+    else:
+        student_ids = split_student_ids(str(data.get('roster') or ''))
+    if not student_ids or len(student_ids) > MAX_STUDENT_IDS:
+        return JsonResponse({
+            'success': False, 'message': f'Send between 1 and {MAX_STUDENT_IDS} student IDs'
+        }, status=400)
+    
+    result = apply_bulk_edit(session, student_ids, action, request.user, str(data.get('reason') or '')[:200])
+    return JsonResponse({'success': True, **result})
+
+@login_required
+@admin_required
+def api_session_records(request, session_id):
+    """Records of a session added after the ?since=<record id> cursor"""
+    try:
+        since = int(request.GET.get('since') or 0)
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Invalid cursor'}, status=400)
+    
+    # Checked before touching attendance tables: an unchanged session costs one
+    # stamp lookup (the owner is cached). Only the owner gets a 304; anyone else
+    # falls through to the 404 below.
+    if session_owner(session_id) == request.user.pk:
+        version = session_records_version(session_id)
+        etag = f'"{session_id}-{version}-{since}"'
+        if version is not None and request.headers.get('If-None-Match') == etag:
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            return response
+    
+    session = get_object_or_404(AttendanceSession, id=session_id, created_by=request.user)
+    
+    # Read the version before the rows so a concurrent scan only makes it look older
+    version = ensure_session_records_version(session_id)
+    records = AttendanceRecord.objects.filter(
+        session=session, id__gt=since
+    ).select_related('student', 'student__user').order_by('id')
+    
+    rows = [{
+        'id': record.id,
+        'student_id': record.student.student_id,
+        'name': record.student.user.get_full_name(),
+        'department': record.student.department,
+        'timestamp': record.timestamp.isoformat(),
+    } for record in records]
+    
+    response = JsonResponse({
+        'success': True,
+        'records': rows,
+        'cursor': rows[-1]['id'] if rows else since,
+        # Lets the page notice removed records and reload the full list
+        'count': AttendanceRecord.objects.filter(session=session).count(),
+    })
+    response['ETag'] = f'"{session_id}-{version}-{since}"'
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+class Echo:
+    """Pseudo-buffer for csv.writer that hands rows straight to a streaming response"""
+    def write(self, value):
+        return value
+
+def stream_csv(header, rows, filename):
+    writer = csv.writer(Echo())
+    
+    def generate():
+        yield writer.writerow(header)
+        for row in rows:
+            yield writer.writerow(row)
+    
+    response = StreamingHttpResponse(generate(), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+@login_required
+@admin_required
+@reads_from_replica
+def export_absentees_csv(request, session_id):
+    session = get_object_or_404(AttendanceSession, id=session_id, created_by=request.user)
+    absentees = Student.objects.absent_from(session).order_by('student_id').values_list(
+        'student_id', 'user__first_name', 'user__last_name', 'department', 'year'
+    )
+    
+    rows = (
+        [student_id, f'{first_name} {last_name}'.strip(), department, year]
+        for student_id, first_name, last_name, department, year in absentees.iterator()
+    )
+    return stream_csv(
+        ['Student ID', 'Name', 'Department', 'Year'],
+        rows,
+        f'absentees_{session.course_code}_{session.id}.csv'
+    )
+
+@login_required
+@admin_required
+@reads_from_replica
+def export_course_absentees_csv(request, course_code):
+    """Enrolled students by how many of the admin's held sessions of the course they missed"""
+    absentees = Student.objects.with_missed_sessions(
+        course_code, AttendanceSession.objects.filter(created_by=request.user)
+    ).filter(
+        missed_sessions__gt=0
+    ).order_by('-missed_sessions', 'student_id').values_list(
+        'student_id', 'user__first_name', 'user__last_name', 'department', 'year', 'missed_sessions'
+    )
+    
+    rows = (
+        [student_id, f'{first_name} {last_name}'.strip(), department, year, missed]
+        for student_id, first_name, last_name, department, year, missed in absentees.iterator()
+    )
+    return stream_csv(
+        ['Student ID', 'Name', 'Department', 'Year', 'Sessions Missed'],
+        rows,
+        f'absentees_{course_code}.csv'
+    )
+
+@login_required
+@admin_required
+@reads_from_replica
+def export_course_matrix(request, course_code, fmt):
+    """Students x sessions grid for the admin's sessions of a course"""
+    matrix = CourseMatrix.build(course_code, AttendanceSession.objects.filter(created_by=request.user))
+    filename = f'attendance_matrix_{course_code}'
+    
+    if fmt == 'csv':
+        return stream_csv(matrix.header(), matrix.rows(), f'{filename}.csv')
+    
+    from openpyxl import Workbook
+    
+    # Write-only workbook spooled to disk once it gets large
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Attendance')
+    sheet.append(matrix.header())
+    for row in matrix.rows():
+        sheet.append(row)
+    output = SpooledTemporaryFile(max_size=5 * 1024 * 1024)
+    workbook.save(output)
+    output.seek(0)
+    
+    return FileResponse(
+        output,
+        as_attachment=True,
+        filename=f'{filename}.xlsx',
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    )
+
+@login_required
+@admin_required
+def manage_enrollment(request):
+    if request.method == 'POST':
+        form = EnrollmentForm(request.POST)
+        if form.is_valid():
+            course_code = form.cleaned_data['course_code']
+            student_ids = form.cleaned_data['student_ids']
+            students = list(Student.objects.filter(student_id__in=student_ids))
+            
+            if form.cleaned_data['action'] == 'enroll':
+                Enrollment.objects.enroll(course_code, students)
+                messages.success(request, f'Enrolled {len(students)} students in {course_code}.')
+            else:
+                removed = Enrollment.objects.unenroll(course_code, students)
+                messages.success(request, f'Removed {removed} students from {course_code}.')
+            
+            unknown = set(student_ids) - {student.student_id for student in students}
+            if unknown:
+                messages.warning(request, f'Unknown student IDs: {", ".join(sorted(unknown))}')
+            return redirect(f"{request.path}?course_code={course_code}")
+    else:
+        form = EnrollmentForm(initial={'course_code': request.GET.get('course_code', '')})
+    
+    course_code = request.GET.get('course_code', '')
+    enrollments = Enrollment.objects.filter(course_code=course_code).select_related(
+        'student', 'student__user'
+    ).order_by('student__student_id') if course_code else Enrollment.objects.none()
+    
+    context = {
+        'form': form,
+        'course_code': course_code,
+        'enrollments': enrollments,
+    }
+    return render(request, 'attendance/manage_enrollment.html', context)
+
+@login_required
+@admin_required
+@reads_from_replica
 def export_attendance_csv(request, session_id):
     session = get_object_or_404(AttendanceSession, id=session_id, created_by=request.user)
     records = AttendanceRecord.objects.filter(session=session).select_related('student', 'student__user')
@@ -272,9 +551,10 @@ def export_attendance_csv(request, session_id):
 
 @login_required
 @admin_required
+@reads_from_replica
 def export_attendance_excel(request, session_id):
     session = get_object_or_404(AttendanceSession, id=session_id, created_by=request.user)
-    records = AttendanceRecord.objects.filter(session=session).select_related('student', 'student__user')
+    records = AttendanceRecord.objects.filter(session=session).select_related('student', 'student__user', 'device')
     
     # Create DataFrame
     data = []
@@ -331,6 +611,7 @@ def manage_students(request):
 @csrf_exempt
 @login_required
 @admin_required
+@throttle('scan', session_kwarg='session_id')
 def api_scan_qr(request, session_id):
     if request.method == 'POST':
         try:
@@ -343,56 +624,65 @@ def api_scan_qr(request, session_id):
                 return JsonResponse({'success': False, 'message': 'Session is not active'})
             
             # Parse QR data
-            if qr_data.startswith('ATT:'):
-                parts = qr_data.split(':')
-                if len(parts) >= 3:
-                    student_id = parts[1]
-                    token = parts[2]
-                    
-                    student = get_object_or_404(Student, student_id=student_id)
-                    qr_code = QRCode.objects.filter(
+            payload = parse_qr_payload(qr_data)
+            if payload:
+                student_id, token = payload
+                
+                student = get_object_or_404(
+                    Student.objects.with_enrollment(session.course_code).select_related('user'),
+                    student_id=student_id
+                )
+                if student.course_has_roster and not student.is_enrolled:
+                    return JsonResponse({
+                        'success': False,
+                        'message': f'{student.user.get_full_name()} is not enrolled in {session.course_code}!'
+                    })
+                
+                qr_code = QRCode.objects.filter(
+                    student=student,
+                    token=token,
+                    is_used=False,
+                    expires_at__gte=timezone.now()
+                ).first()
+                
+                if qr_code:
+                    # Check if already marked
+                    existing_record = AttendanceRecord.objects.filter(
                         student=student,
-                        token=token,
-                        is_used=False,
-                        expires_at__gte=timezone.now()
+                        session=session
                     ).first()
                     
-                    if qr_code:
-                        # Check if already marked
-                        existing_record = AttendanceRecord.objects.filter(
-                            student=student,
-                            session=session
-                        ).first()
-                        
-                        if existing_record:
-                            return JsonResponse({
-                                'success': False,
-                                'message': f'{student.user.get_full_name()} is already marked present!'
-                            })
-                        
-                        # Create attendance record
-                        AttendanceRecord.objects.create(
+                    if existing_record:
+                        return JsonResponse({
+                            'success': False,
+                            'message': f'{student.user.get_full_name()} is already marked present!'
+                        })
+                    
+                    # Create attendance record and mark the QR as used; one commit
+                    # for both and the version stamps the record's signal bumps
+                    with transaction.atomic():
+                        record = AttendanceRecord.objects.create(
                             student=student,
                             session=session,
                             qr_code=qr_code,
                             ip_address=request.META.get('REMOTE_ADDR'),
-                            device_info=request.META.get('HTTP_USER_AGENT', '')
+                            device_id=Device.objects.intern(request.META.get('HTTP_USER_AGENT', ''))
                         )
-                        
-                        # Mark QR as used
                         qr_code.is_used = True
                         qr_code.save()
-                        
-                        return JsonResponse({
-                            'success': True,
-                            'message': f'Attendance marked for {student.user.get_full_name()}!',
-                            'student': {
-                                'id': student.student_id,
-                                'name': student.user.get_full_name(),
-                                'department': student.department
-                            }
-                        })
-            
+                    
+                    anomaly_detector.observe(record)
+                    
+                    return JsonResponse({
+                        'success': True,
+                        'message': f'Attendance marked for {student.user.get_full_name()}!',
+                        'student': {
+                            'id': student.student_id,
+                            'name': student.user.get_full_name(),
+                            'department': student.department
+                        }
+                    })
+        
             return JsonResponse({'success': False, 'message': 'Invalid or expired QR code'})
             
         except json.JSONDecodeError:
@@ -400,4 +690,218 @@ def api_scan_qr(request, session_id):
         except Exception as e:
             return JsonResponse({'success': False, 'message': str(e)})
     
-    return JsonResponse({'success': False, 'message': 'Invalid request method'})
\ No newline at end of file
+    return JsonResponse({'success': False, 'message': 'Invalid request method'})
+
+def session_qr_svg(data):
+    import qrcode
+    import qrcode.image.svg
+    
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_L, border=2,
+                       image_factory=qrcode.image.svg.SvgPathImage)
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr.make_image().to_string(encoding='unicode')
+
+@login_required
+@admin_required
+def session_display(request, session_id):
+    """Projector page showing the rotating session code (reverse mode)"""
+    session = get_object_or_404(AttendanceSession, id=session_id, created_by=request.user)
+    
+    if not session.is_live():
+        messages.error(request, 'This session is not active or has ended.')
+        return redirect('admin_dashboard')
+    
+    qr_data, expires_in = session_payload(session.id)
+    context = {
+        'session': session,
+        'qr_svg': session_qr_svg(qr_data),
+        'expires_in': expires_in,
+        'rotate_seconds': rotate_seconds(),
+        'attendance_count': AttendanceRecord.objects.filter(session=session).count(),
+    }
+    return render(request, 'attendance/session_display.html', context)
+
+@login_required
+@admin_required
+def api_session_display_code(request, session_id):
+    session = get_object_or_404(AttendanceSession, id=session_id, created_by=request.user)
+    if not session.is_live():
+        return JsonResponse({'success': False, 'message': 'Session is not active'})
+    
+    qr_data, expires_in = session_payload(session.id)
+    return JsonResponse({
+        'success': True,
+        'qr_svg': session_qr_svg(qr_data),
+        'expires_in': expires_in,
+        'count': AttendanceRecord.objects.filter(session=session).count(),
+    })
+
+@login_required
+@student_required
+def student_checkin(request):
+    """Phone camera page for scanning the projected session code"""
+    return render(request, 'attendance/checkin.html')
+
+@login_required
+@student_required
+@throttle('checkin')
+def api_checkin(request):
+    """Mark the logged-in student present from a projected session code"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': 'Invalid request method'})
+    try:
+        qr_data = json.loads(request.body).get('qr_data')
+    except (json.JSONDecodeError, AttributeError):
+        return JsonResponse({'success': False, 'message': 'Invalid JSON data'})
+    
+    session_id = verify_session_payload(qr_data)
+    if session_id is None:
+        return JsonResponse({'success': False, 'message': 'Invalid or expired session code'})
+    
+    # The same few queries for every check-in: the session with the roster checks
+    # folded in, then the insert. The unique constraint catches repeats.
+    student = request.user.student_profile
+    rosters = Enrollment.objects.filter(course_code=OuterRef('course_code'))
+    session = AttendanceSession.objects.annotate(
+        course_has_roster=Exists(rosters),
+        is_enrolled=Exists(rosters.filter(student=student)),
+    ).filter(id=session_id).first()
+    
+    if session is None or not session.is_live():
+        return JsonResponse({'success': False, 'message': 'Session is not active'})
+    if session.course_has_roster and not session.is_enrolled:
+        return JsonResponse({'success': False, 'message': f'You are not enrolled in {session.course_code}!'})
+    
+    try:
+        with transaction.atomic():
+            AttendanceRecord.objects.create(
+                student=student,
+                session=session,
+                ip_address=request.META.get('REMOTE_ADDR'),
+                device_id=Device.objects.intern(request.META.get('HTTP_USER_AGENT', '')),
+                source='checkin',
+            )
+    except IntegrityError:
+        return JsonResponse({'success': False, 'message': 'You are already marked present!'})
+    
+    return JsonResponse({
+        'success': True,
+        'message': f'Attendance marked for {session.course_code} - {session.name}!',
+    })
+
+@login_required
+@admin_required
+def api_records_feed(request):
+    """Gzip NDJSON of attendance records for warehouse loads.
+    ?course=&start=&end= filter, ?updated_since= or ?cursor= pick up where the last load stopped;
+    incremental loads also list records removed by bulk unmarks."""
+    try:
+        records, tombstones, state = parse_feed_params(request.GET, request.user)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    
+    response = StreamingHttpResponse(feed(records, state, tombstones), content_type='application/x-ndjson')
+    response['Content-Encoding'] = 'gzip'
+    response['Cache-Control'] = 'no-store'
+    return response
+
+@login_required
+@admin_required
+def api_at_risk(request):
+    """Students below ?below= percent or with ?streak= consecutive absences in the admin's sessions
+    (every session for superusers), answered from the attendance bitsets"""
+    try:
+        below = float(request.GET.get('below') or 75)
+        streak = int(request.GET.get('streak') or 3)
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Invalid threshold'}, status=400)
+    
+    course_codes = course_codes_for(request.user)
+    requested = [code for code in request.GET.getlist('course') if code]
+    if requested:
+        course_codes = [code for code in course_codes if code in requested]
+    
+    # Like the other admin reports, only the admin's own sessions count
+    sessions = AttendanceSession.objects.all()
+    if not request.user.is_superuser:
+        sessions = sessions.filter(created_by=request.user)
+    students = at_risk(course_codes, below=below, streak=streak, sessions_queryset=sessions)
+    return JsonResponse({'success': True, 'below': below, 'streak': streak, 'count': len(students), 'students': students})
+
+@login_required
+@admin_required
+def api_throttle_stats(request):
+    """Throttle hit rates for monitoring (per worker process)"""
+    return JsonResponse({'scopes': throttle_stats()})
+
+@login_required
+@admin_required
+def profile_captures(request):
+    context = {
+        'captures': list_captures(),
+        'enabled': profiler_settings()['ENABLED'],
+    }
+    return render(request, 'attendance/profile_captures.html', context)
+
+@login_required
+@admin_required
+def download_profile(request, name, kind):
+    path = capture_path(name, '.prof' if kind == 'prof' else '.txt')
+    if path is None:
+        raise Http404('No such capture')
+    return FileResponse(open(path, 'rb'), as_attachment=kind == 'prof', filename=path.name)
+
+def export_job_json(job):
+    return {
+        'id': job.id,
+        'status': job.status,
+        'format': job.export_format,
+        'progress': job.progress,
+        'total': job.total,
+        'percent': round(100 * job.progress / job.total) if job.total else (100 if job.status == 'done' else 0),
+        'error': job.error,
+        'status_url': reverse('api_export_status', args=[job.id]),
+        'download_url': reverse('download_export', args=[job.id]) if job.status == 'done' else None,
+        'expires_at': job.expires_at.isoformat() if job.expires_at else None,
+    }
+
+@login_required
+@admin_required
+def api_create_export(request):
+    """Queue a background export: {"format": "csv"|"excel", "session_ids": [...],
+    "course_codes": [...], "start": "YYYY-MM-DD", "end": "YYYY-MM-DD"}"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': 'Invalid request method'}, status=405)
+    try:
+        data = json.loads(request.body)
+        export_format = data.get('format', 'csv')
+        if export_format not in dict(ExportJob.FORMATS):
+            raise ValueError(f'Unknown format {export_format}')
+        params = normalize_params(data)
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'message': 'Invalid JSON data'}, status=400)
+    except (TypeError, ValueError) as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    
+    job, created = submit_export(request.user, export_format, params)
+    return JsonResponse({'success': True, 'created': created, 'job': export_job_json(job)}, status=202)
+
+@login_required
+@admin_required
+def api_export_status(request, job_id):
+    job = get_object_or_404(ExportJob, id=job_id, requested_by=request.user)
+    return JsonResponse({'success': True, 'job': export_job_json(job)})
+
+@login_required
+@admin_required
+def download_export(request, job_id):
+    job = get_object_or_404(ExportJob, id=job_id, requested_by=request.user, status='done')
+    if job.expires_at and job.expires_at < timezone.now():
+        raise Http404('This export has expired')
+    try:
+        output = open(job.file_path, 'rb')
+    except OSError:
+        raise Http404('Export file is missing')
+    extension = 'xlsx' if job.export_format == 'excel' else 'csv'
+    return FileResponse(output, as_attachment=True, filename=f'attendance_export_{job.id}.{extension}')
\ No newline at end of file
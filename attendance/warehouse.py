@@ -0,0 +1,177 @@
+# attendance/warehouse.py
+# Bulk record feed for the data warehouse: gzip-compressed NDJSON, read in
+# key ranges so no query ever uses OFFSET. Two orders are supported:
+#   id       full loads, pages of `last id < id <= last id + PAGE_SIZE`
+#   updated  incremental loads, the next PAGE_SIZE `(updated_at, id)` keys
+# Every page is followed by a {"cursor": ...} line; passing the last cursor
+# seen resumes the feed right after the last complete page.
+# Incremental loads end with tombstones, {"id": ..., "deleted": true, ...}
+# lines for records removed by bulk unmarks (AttendanceEdit) since the last
+# load; the cursor tracks them by edit id.
+import base64
+import json
+import zlib
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db.models import Max, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import AttendanceEdit, AttendanceRecord
+
+PAGE_SIZE = 5000
+
+FIELDS = {
+    'id': 'id',
+    'session_id': 'session_id',
+    'course_code': 'session__course_code',
+    'session_name': 'session__name',
+    'session_start': 'session__start_time',
+    'student_id': 'student__student_id',
+    'first_name': 'student__user__first_name',
+    'last_name': 'student__user__last_name',
+    'department': 'student__department',
+    'year': 'student__year',
+    'timestamp': 'timestamp',
+    'ip_address': 'ip_address',
+    'device': 'device__user_agent',
+    'updated_at': 'updated_at',
+    'source': 'source',
+}
+
+TOMBSTONE_FIELDS = {
+    'id': 'record_id',
+    'session_id': 'session_id',
+    'course_code': 'session__course_code',
+    'student_id': 'student__student_id',
+    'updated_at': 'created_at',
+}
+
+def encode_cursor(state):
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(',', ':')).encode()).decode()
+
+def decode_cursor(cursor):
+    """Raises ValueError for anything that isn't a cursor we issued"""
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        state['id'] = int(state['id'])
+        if state['mode'] == 'updated':
+            state['edit_id'] = int(state.get('edit_id', 0))
+            state['updated_at'] = parse_datetime(state['updated_at'])
+            if state['updated_at'] is None:
+                raise ValueError
+        elif state['mode'] != 'id':
+            raise ValueError
+    except (TypeError, KeyError, AttributeError, json.JSONDecodeError, UnicodeDecodeError, ValueError):
+        raise ValueError('Invalid cursor')
+    return state
+
+def parse_feed_params(query, user):
+    """(records, tombstones, cursor state) from the request's query string. Raises ValueError."""
+    records = AttendanceRecord.objects.all()
+    tombstones = AttendanceEdit.objects.filter(action='unmark', record_id__isnull=False)
+    if not user.is_superuser:
+        records = records.filter(session__created_by=user)
+        tombstones = tombstones.filter(session__created_by=user)
+
+    course_codes = [code.strip() for code in query.getlist('course') if code.strip()]
+    if course_codes:
+        records = records.filter(session__course_code__in=course_codes)
+        tombstones = tombstones.filter(session__course_code__in=course_codes)
+
+    tz = timezone.get_current_timezone()
+    if query.get('start'):
+        start = datetime.combine(datetime.strptime(query['start'], '%Y-%m-%d'), time.min)
+        records = records.filter(timestamp__gte=timezone.make_aware(start, tz))
+    if query.get('end'):
+        end = datetime.combine(datetime.strptime(query['end'], '%Y-%m-%d'), time.max)
+        records = records.filter(timestamp__lte=timezone.make_aware(end, tz))
+
+    if query.get('cursor'):
+        state = decode_cursor(query['cursor'])
+    elif query.get('updated_since'):
+        updated_since = parse_datetime(query['updated_since'])
+        if updated_since is None:
+            raise ValueError('updated_since must be an ISO 8601 datetime')
+        if timezone.is_naive(updated_since):
+            updated_since = timezone.make_aware(updated_since, tz)
+        # Inclusive: (updated_since, 0) sorts before every row updated at that instant
+        state = {'mode': 'updated', 'updated_at': updated_since, 'id': 0, 'edit_id': AttendanceEdit.objects.filter(
+            created_at__lt=updated_since
+        ).aggregate(last_id=Max('id'))['last_id'] or 0}
+    else:
+        state = {'mode': 'id', 'id': 0}
+    return records, tombstones, state
+
+def _windows(state):
+    """Successive key windows over the whole record table, with no joins or
+    filters, so each step is a plain primary key or updated_at index range"""
+    if state['mode'] == 'updated':
+        settle = timedelta(seconds=getattr(settings, 'ATTENDANCE_FEED_SETTLE_SECONDS', 5))
+        # Rows saved in the last few seconds may not all be committed yet; leave
+        # them for the next load instead of stepping the cursor past them
+        keys = AttendanceRecord.objects.filter(updated_at__lt=timezone.now() - settle).order_by('updated_at', 'id')
+        while True:
+            window = list(keys.filter(
+                Q(updated_at__gt=state['updated_at']) | Q(updated_at=state['updated_at'], id__gt=state['id'])
+            ).values_list('id', 'updated_at')[:PAGE_SIZE])
+            if not window:
+                return
+            state = {**state, 'id': window[-1][0], 'updated_at': window[-1][1]}
+            yield Q(id__in=[key for key, _ in window]), state
+            if len(window) < PAGE_SIZE:
+                return
+    else:
+        last_id = AttendanceRecord.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+        while state['id'] < last_id:
+            upper = min(state['id'] + PAGE_SIZE, last_id)
+            window = Q(id__gt=state['id'], id__lte=upper)
+            state = {'mode': 'id', 'id': upper}
+            yield window, state
+
+def _pages(records, state):
+    order = ('updated_at', 'id') if state['mode'] == 'updated' else ('id',)
+    rows = records.order_by(*order).values(*FIELDS.values())
+    for window, state in _windows(state):
+        # A window can be empty once the filters apply; its cursor still moves on
+        yield list(rows.filter(window)), state
+
+def _tombstone_pages(tombstones, state):
+    settle = timedelta(seconds=getattr(settings, 'ATTENDANCE_FEED_SETTLE_SECONDS', 5))
+    edits = tombstones.filter(created_at__lt=timezone.now() - settle).order_by('id')
+    while True:
+        page = list(edits.filter(id__gt=state['edit_id']).values_list('id', *TOMBSTONE_FIELDS.values())[:PAGE_SIZE])
+        if not page:
+            return
+        state = {**state, 'edit_id': page[-1][0]}
+        yield [row[1:] for row in page], state
+        if len(page) < PAGE_SIZE:
+            return
+
+def _line(data):
+    return (json.dumps(data, default=lambda value: value.isoformat(), separators=(',', ':')) + '\n').encode()
+
+def _cursor_line(state, complete):
+    cursor_state = dict(state)
+    if 'updated_at' in cursor_state:
+        cursor_state['updated_at'] = cursor_state['updated_at'].isoformat()
+    return _line({'cursor': encode_cursor(cursor_state), 'complete': complete})
+
+def feed(records, state, tombstones=None):
+    """gzip chunks of NDJSON records, a cursor line after each page"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    names = list(FIELDS)
+    for page, state in _pages(records, state):
+        if not page:
+            continue
+        chunk = b''.join(_line(dict(zip(names, row.values()))) for row in page)
+        chunk += _cursor_line(state, complete=False)
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    if state['mode'] == 'updated' and tombstones is not None:
+        names = list(TOMBSTONE_FIELDS)
+        for page, state in _tombstone_pages(tombstones, state):
+            chunk = b''.join(_line({**dict(zip(names, row)), 'deleted': True}) for row in page)
+            chunk += _cursor_line(state, complete=False)
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.compress(_cursor_line(state, complete=True)) + compressor.flush()
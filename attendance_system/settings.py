@@ -38,8 +38,11 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'attendance.middleware.ReadYourWritesMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Must stay last, see attendance/profiling.py
+    'attendance.profiling.ProfilerMiddleware',
 ]
 
 ROOT_URLCONF = 'attendance_system.urls'
@@ -69,9 +72,23 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        # A file, not memory, so the cache coherence tests' worker processes share it
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+    },
+    # Snapshot of the primary used by exports, history and dashboards.
+    # Refreshed in the background or with `manage.py refresh_replica`.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db_replica.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    },
 }
 
+DATABASE_ROUTERS = ['attendance.routers.ReplicaRouter']
+
+# Seconds the replica may lag behind the primary before reads fall back to it
+ATTENDANCE_REPLICA_MAX_LAG = 60
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -127,3 +144,50 @@ LOGOUT_REDIRECT_URL = 'login'
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+
+
+# Process-local cache; dashboard lists and record versions live here
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'attendance',
+    }
+}
+# Upper bound (seconds) on how long a cached dashboard list is served
+ATTENDANCE_DASHBOARD_CACHE_TTL = 300
+
+# Token-bucket throttling for the QR refresh and scan APIs ('<count>/<s|min|hour>')
+ATTENDANCE_THROTTLE_RATES = {
+    'qr': '20/min',
+    'scan': '240/min',
+    # Per attendance session. Caps multi-station scanning: at ATTENDANCE_SCAN_SECONDS
+    # a scan, 120/min is 10 stations; raise it with the station count.
+    'scan_session': '120/min',
+    'checkin': '10/min',
+}
+# Set to a cache alias (e.g. 'default' backed by a shared cache) to share buckets between workers
+ATTENDANCE_THROTTLE_CACHE = None
+
+# On-demand profiling: admins send `X-Profile: 1` (cProfile) or `X-Profile: mem`
+# (plus tracemalloc). Captures are listed at /admin/profiles/.
+ATTENDANCE_PROFILER = {
+    'ENABLED': False,
+    'DIR': BASE_DIR / 'profiles',
+    'MAX_CAPTURES': 50,
+    'SAMPLE_RATE': 1.0,
+    'MIN_INTERVAL': 10,
+    'TRACEMALLOC': True,
+}
+
+# Background exports: worker threads per process and how long results are kept (seconds)
+ATTENDANCE_EXPORT_WORKERS = 2
+ATTENDANCE_EXPORT_TTL = 24 * 60 * 60
+
+# Reverse mode: how often the projected session code rotates (seconds)
+ATTENDANCE_SESSION_QR_ROTATE = 15
+
+# Student QR payload format: 2 = compact alphanumeric (QR version 1), 1 = original ATT: format
+ATTENDANCE_QR_PAYLOAD_VERSION = 2
+
+# Seconds a scanner station needs per scan, for arrival queue and station estimates
+ATTENDANCE_SCAN_SECONDS = 5
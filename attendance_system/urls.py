@@ -5,8 +5,10 @@ from django.conf import settings
 from django.conf.urls.static import static
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
+    # The app's own admin/... pages come first: Django admin's catch-all would
+    # otherwise take every path under admin/
     path('', include('attendance.urls')),
+    path('admin/', admin.site.urls),
 ]
 
 if settings.DEBUG: